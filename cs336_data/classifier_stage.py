@@ -0,0 +1,194 @@
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from cs336_data.model_registry import get_model, shared_model_pool
+from cs336_data.parallel import iter_chunks, ordered_chunk_map
+
+
+def replace_newlines(text: str) -> str:
+    """Preprocessing of the language ID, NSFW and hate speech classifiers (fastText rejects newlines)."""
+    return text.replace('\n', ' ')
+
+
+def collapse_whitespace(text: str) -> str:
+    """Preprocessing of the quality classifier."""
+    return ' '.join(text.split())
+
+
+@dataclass
+class ClassifierRule:
+    """One fastText model in a ClassifierStage and the predicate a document must pass to be kept."""
+    name: str
+    model_path: str
+    accept: Callable[[str, float], bool]
+    quantized: bool = False
+    normalize: Callable[[str], str] = replace_newlines
+
+
+@dataclass
+class StageResult:
+    keep: bool
+    rejected_by: str | None = None
+    predictions: dict[str, tuple[str, float]] = field(default_factory=dict)
+
+
+class ClassifierStage:
+    """Run several fastText classifiers over each document, normalizing it once per distinct preprocessing.
+
+    Each rule normalizes text the way the single-document function for its
+    model does, so the stage gives the same scores; rules with the same
+    normalize function share one normalized copy. Rules are evaluated in order
+    and evaluation stops at the first rule that rejects the document, so put
+    cheap or highly selective models first. Time spent in each model is
+    accumulated in timings.
+    """
+
+    def __init__(self, rules: list[ClassifierRule]):
+        self.rules = rules
+        self.timings = {rule.name: 0.0 for rule in rules}
+        self.calls = {rule.name: 0 for rule in rules}
+
+    def _model(self, rule: ClassifierRule):
+        return get_model(rule.model_path, quantized=rule.quantized)
+
+    def __call__(self, text: str) -> StageResult:
+        normalized = {}
+        result = StageResult(keep=True)
+        for rule in self.rules:
+            model = self._model(rule)
+            if rule.normalize not in normalized:
+                normalized[rule.normalize] = rule.normalize(text)
+            start = time.perf_counter()
+            labels, scores = model.predict(normalized[rule.normalize], k=1)
+            self.timings[rule.name] += time.perf_counter() - start
+            self.calls[rule.name] += 1
+
+            label, score = labels[0].replace('__label__', ''), float(scores[0])
+            result.predictions[rule.name] = (label, score)
+            if not rule.accept(label, score):
+                result.keep = False
+                result.rejected_by = rule.name
+                break
+        return result
+
+    def run_batch(self, texts: list[str]) -> list[StageResult]:
+        """Classify a batch; each model only sees the documents every earlier model kept."""
+        normalized = {}
+        results = [StageResult(keep=True) for _ in texts]
+        alive = np.arange(len(texts))
+        for rule in self.rules:
+            if len(alive) == 0:
+                break
+            model = self._model(rule)
+            if rule.normalize not in normalized:
+                normalized[rule.normalize] = [rule.normalize(text) for text in texts]
+            batch = normalized[rule.normalize]
+            start = time.perf_counter()
+            labels, scores = model.predict([batch[i] for i in alive], k=1)
+            self.timings[rule.name] += time.perf_counter() - start
+            self.calls[rule.name] += len(alive)
+
+            keep = np.ones(len(alive), dtype=bool)
+            for j, (i, label, score) in enumerate(zip(alive, labels, scores)):
+                label, score = label[0].replace('__label__', ''), float(score[0])
+                results[i].predictions[rule.name] = (label, score)
+                if not rule.accept(label, score):
+                    results[i].keep = False
+                    results[i].rejected_by = rule.name
+                    keep[j] = False
+            alive = alive[keep]
+        return results
+
+    def filter(self, texts: Iterable[str], batch_size: int = 1024, num_workers: int = 1) -> Iterator[str]:
+        """Yield only the documents that pass every rule, in input order.
+
+        num_workers > 1 classifies batches in a shared_model_pool: every model is
+        loaded here first and the workers are forked afterwards, so they share
+        one copy of the weights. Their timings and calls are added to this stage's.
+        """
+        if num_workers == 1:
+            for chunk in iter_chunks(texts, batch_size):
+                for text, result in zip(chunk, self.run_batch(chunk)):
+                    if result.keep:
+                        yield text
+            return
+
+        global _active_stage
+        for rule in self.rules:
+            self._model(rule)
+        _active_stage = self
+        try:
+            with shared_model_pool(num_workers) as executor:
+                for kept, timings, calls in ordered_chunk_map(
+                    _filter_chunk, texts, num_workers, batch_size, executor=executor
+                ):
+                    for name in self.timings:
+                        self.timings[name] += timings[name]
+                        self.calls[name] += calls[name]
+                    yield from kept
+        finally:
+            _active_stage = None
+
+    def report(self) -> str:
+        lines = []
+        for name in self.timings:
+            calls = self.calls[name]
+            per_doc = self.timings[name] / calls * 1e6 if calls else 0.0
+            lines.append(f"{name:>12}: {calls:>10} docs {self.timings[name]:8.2f}s ({per_doc:.1f} us/doc)")
+        return '\n'.join(lines)
+
+
+# Set by ClassifierStage.filter before its pool forks, so workers inherit the stage and its loaded models
+_active_stage: ClassifierStage | None = None
+
+
+def _filter_chunk(texts: list[str]) -> list[tuple[list[str], dict[str, float], dict[str, int]]]:
+    """Worker side of ClassifierStage.filter: the kept texts of a chunk and the time and calls it took per model."""
+    stage = _active_stage
+    timings, calls = dict(stage.timings), dict(stage.calls)
+    kept = [text for text, result in zip(texts, stage.run_batch(texts)) if result.keep]
+    return [(
+        kept,
+        {name: stage.timings[name] - timings[name] for name in timings},
+        {name: stage.calls[name] - calls[name] for name in calls},
+    )]
+
+
+def default_classifier_stage(
+    language: str = 'en',
+    min_language_score: float = 0.65,
+    max_nsfw_score: float = 0.9,
+    max_toxic_score: float = 0.9,
+    min_quality_score: float | None = None,
+) -> ClassifierStage:
+    """Language ID, NSFW and hate speech filters (and optionally quality) with the repo's model paths."""
+    from cs336_data import harmful_content, language_identification, quality_classifier
+
+    rules = [
+        ClassifierRule(
+            'language',
+            language_identification.model_path,
+            lambda label, score: label == language and score >= min_language_score,
+        ),
+        ClassifierRule(
+            'nsfw',
+            harmful_content.model_path_nsfw,
+            lambda label, score: not (label == 'nsfw' and score >= max_nsfw_score),
+        ),
+        ClassifierRule(
+            'hatespeech',
+            harmful_content.model_path_hatespeech,
+            lambda label, score: not (label == 'toxic' and score >= max_toxic_score),
+        ),
+    ]
+    if min_quality_score is not None:
+        rules.append(ClassifierRule(
+            'quality',
+            quality_classifier.MODEL_PATH,
+            lambda label, score: label == 'high_quality' and score >= min_quality_score,
+            normalize=collapse_whitespace,
+        ))
+    return ClassifierStage(rules)
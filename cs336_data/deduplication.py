@@ -1,29 +1,817 @@
 import os
 import hashlib
-from typing import List
+import math
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 
-def run_exact_line_deduplication(input_files: List[str], output_dir: str) -> None:
+import mmh3
+import numpy as np
+
+HASH_BATCH_LINES = 1 << 20
+HASH_BATCH_BYTES = 4 * 1024 * 1024
+COPY_BLOCK_BYTES = 16 * 1024 * 1024
+MIN_MERGE_BLOCK = 1 << 12
+EXTERNAL_BYTES_PER_HASH = 96
+
+
+def read_lines(path: str) -> list[bytes]:
+    """Lines of a file as bytes, without their trailing newline. Reads the whole file; the dedup passes stream it."""
+    with open(path, 'rb') as f:
+        lines = f.read().split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    return lines
+
+
+def line_hashes(lines: list[bytes]) -> np.ndarray:
+    """64-bit MurmurHash3 of every line as a uint64 array."""
+    return np.fromiter((mmh3.hash64(line)[0] for line in lines), dtype=np.int64, count=len(lines)).view(np.uint64)
+
+
+def iter_line_batches(path: str, batch_bytes: int) -> Iterator[list[bytes]]:
+    """read_lines for files that may not fit in memory: batches of lines totalling about batch_bytes."""
+    with open(path, 'rb') as f:
+        while batch := f.readlines(batch_bytes):
+            yield [line[:-1] if line.endswith(b'\n') else line for line in batch]
+
+
+def iter_file_hashes(
+    path: str, sidecar_file: str | None = None, batch_bytes: int = HASH_BATCH_BYTES
+) -> Iterator[np.ndarray]:
+    """line_hashes of a file in batches of about batch_bytes of input, also appended to sidecar_file if given."""
+    f_sidecar = open(sidecar_file, 'wb') if sidecar_file is not None else None
+    try:
+        for lines in iter_line_batches(path, batch_bytes):
+            hashes = line_hashes(lines)
+            if f_sidecar is not None:
+                f_sidecar.write(hashes.tobytes())
+            yield hashes
+    finally:
+        if f_sidecar is not None:
+            f_sidecar.close()
+
+
+class LineHashCounter:
+    """Occurrence counts of 64-bit line hashes in NumPy open-addressing arrays.
+
+    Every slot is a uint64 key plus a uint8 count that saturates at 255 (a zero
+    count marks an empty slot), so a table at max_load costs 9 / max_load bytes
+    per distinct line. Collisions are resolved by linear probing, vectorized
+    over a whole batch of hashes at a time.
+    """
+
+    def __init__(self, capacity: int = 1 << 16, max_load: float = 0.7):
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.counts = np.zeros(capacity, dtype=np.uint8)
+        self.max_load = max_load
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.counts.nbytes
+
+    def add(self, hashes: np.ndarray) -> None:
+        keys, counts = np.unique(hashes, return_counts=True)
+        if self.size + len(keys) > self.max_load * len(self.keys):
+            self._grow(self.size + len(keys))
+        self._insert(keys, np.minimum(counts, 255).astype(np.uint8))
+
+    def get(self, hashes: np.ndarray) -> np.ndarray:
+        """Count of every hash (0 if it was never added)."""
+        mask = len(self.keys) - 1
+        result = np.zeros(len(hashes), dtype=np.uint8)
+        pending = np.arange(len(hashes))
+        slots = (hashes & np.uint64(mask)).astype(np.intp)
+        while len(pending):
+            slot_counts = self.counts[slots]
+            found = (slot_counts > 0) & (self.keys[slots] == hashes[pending])
+            result[pending[found]] = slot_counts[found]
+            probe = ~found & (slot_counts > 0)
+            pending, slots = pending[probe], (slots[probe] + 1) & mask
+        return result
+
+    def _insert(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        # keys must be unique within the call
+        mask = len(self.keys) - 1
+        slots = (keys & np.uint64(mask)).astype(np.intp)
+        while len(keys):
+            slot_counts = self.counts[slots]
+            empty = slot_counts == 0
+            found = ~empty & (self.keys[slots] == keys)
+            if found.any():
+                total = slot_counts[found].astype(np.uint16) + counts[found]
+                self.counts[slots[found]] = np.minimum(total, 255)
+
+            claimed = np.zeros(len(keys), dtype=bool)
+            if empty.any():
+                # Several keys may probe the same empty slot; the first one takes it
+                candidates = np.flatnonzero(empty)
+                _, first = np.unique(slots[candidates], return_index=True)
+                winners = candidates[first]
+                self.keys[slots[winners]] = keys[winners]
+                self.counts[slots[winners]] = counts[winners]
+                self.size += len(winners)
+                claimed[winners] = True
+
+            # Keys that lost the race re-check the same slot, now occupied, and move on next round
+            occupied = ~empty & ~found
+            slots[occupied] = (slots[occupied] + 1) & mask
+            pending = ~(found | claimed)
+            keys, counts, slots = keys[pending], counts[pending], slots[pending]
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.keys)
+        while needed > self.max_load * capacity:
+            capacity *= 2
+        occupied = self.counts > 0
+        keys, counts = self.keys[occupied], self.counts[occupied]
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.counts = np.zeros(capacity, dtype=np.uint8)
+        self.size = 0
+        self._insert(keys, counts)
+
+
+def _open_array(path: str, dtype) -> np.ndarray:
+    """Read-only memory map of a raw array file (np.memmap cannot map an empty file)."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+def sidecar_path(sidecar_dir: str, index: int) -> str:
+    """Where pass one stores the raw uint64 line hashes of the index-th input file (names may repeat)."""
+    return os.path.join(sidecar_dir, f"{index}.hashes")
+
+
+def sidecar_paths(input_files: list[str], sidecar_dir: str) -> list[str]:
+    return [sidecar_path(sidecar_dir, i) for i in range(len(input_files))]
+
+
+def count_line_hashes(input_files: list[str], sidecar_files: list[str] | None = None) -> LineHashCounter:
+    """First dedup pass: a LineHashCounter over every line of every file, streamed and filled in large batches.
+
+    If sidecar_files is given, each file's line hashes are also written there.
+    """
+    counter = LineHashCounter()
+    batch, batch_lines = [], 0
+    for i, input_file in enumerate(input_files):
+        for hashes in iter_file_hashes(input_file, sidecar_files[i] if sidecar_files is not None else None):
+            batch.append(hashes)
+            batch_lines += len(hashes)
+            if batch_lines >= HASH_BATCH_LINES:
+                counter.add(np.concatenate(batch))
+                batch, batch_lines = [], 0
+    if batch:
+        counter.add(np.concatenate(batch))
+    return counter
+
+
+def _write_kept_lines(
+    input_file: str, output_dir: str, sidecar_file: str, keep_mask, block_bytes: int = COPY_BLOCK_BYTES
+) -> int:
+    """Second dedup pass for one file: write the lines whose hashes keep_mask accepts; returns the line count.
+
+    The hashes come from the memory-mapped sidecar of pass one. The file is
+    read in blocks of block_bytes, newlines are located with NumPy and the
+    kept lines are copied as byte ranges, so nothing is decoded or rehashed.
+    A last line without a newline gets one, as in the output of read_lines.
+    """
+    output_file_path = os.path.join(output_dir, os.path.basename(input_file))
+    hashes = _open_array(sidecar_file, np.uint64)
+    line, carry = 0, b''
+    with open(input_file, 'rb') as f_in, open(output_file_path, 'wb') as f_out:
+        while block := f_in.read(block_bytes):
+            buffer = carry + block if carry else block
+            data = np.frombuffer(buffer, dtype=np.uint8)
+            newlines = np.flatnonzero(data == 10)
+            if len(newlines) == 0:
+                carry = buffer
+                continue
+            keep = keep_mask(hashes[line:line + len(newlines)])
+            lengths = np.diff(newlines, prepend=-1)
+            f_out.write(data[:newlines[-1] + 1][np.repeat(keep, lengths)])
+            line += len(newlines)
+            carry = buffer[newlines[-1] + 1:]
+        if carry:
+            if keep_mask(hashes[line:line + 1])[0]:
+                f_out.write(carry + b'\n')
+            line += 1
+    del hashes
+    return line
+
+
+def _not_in_sorted(hashes: np.ndarray, sorted_hashes: np.ndarray) -> np.ndarray:
+    index = np.searchsorted(sorted_hashes, hashes)
+    found = index < len(sorted_hashes)
+    found[found] = sorted_hashes[index[found]] == hashes[found]
+    return ~found
+
+
+def _hash_shard(
+    input_files: list[str], sidecar_files: list[str], partition_bits: int
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Map step: (sorted unique hashes, saturated counts) of a shard of files, split by the top hash bits.
+
+    Each file's line hashes are also written to its sidecar for the rewrite step.
+    """
+    file_hashes = []
+    for path, sidecar_file in zip(input_files, sidecar_files):
+        file_hashes.extend(iter_file_hashes(path, sidecar_file))
+    hashes = np.concatenate(file_hashes or [np.zeros(0, np.uint64)])
+    keys, counts = np.unique(hashes, return_counts=True)
+    counts = np.minimum(counts, 255).astype(np.uint8)
+    # keys are sorted, so every partition is a contiguous range
+    starts = np.arange(2 ** partition_bits, dtype=np.uint64) << np.uint64(64 - partition_bits)
+    bounds = [*np.searchsorted(keys, starts[1:]), len(keys)] if partition_bits else [len(keys)]
+    partitions, start = [], 0
+    for end in bounds:
+        partitions.append((keys[start:end], counts[start:end]))
+        start = end
+    return partitions
+
+
+def _duplicates_in_partition(parts: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """Reduce step: sorted hashes seen more than once across every shard's slice of one partition."""
+    keys = np.concatenate([keys for keys, _ in parts] or [np.zeros(0, np.uint64)])
+    counts = np.concatenate([counts for _, counts in parts] or [np.zeros(0, np.uint8)])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts, minlength=len(unique))
+    return unique[totals > 1]
+
+
+# Set in the parent before the rewrite pool forks, so workers share it copy-on-write
+_duplicate_hashes = np.zeros(0, dtype=np.uint64)
+
+
+def _rewrite_shard(input_files: list[str], sidecar_files: list[str], output_dir: str) -> int:
+    return sum(
+        _write_kept_lines(path, output_dir, sidecar_file, lambda hashes: _not_in_sorted(hashes, _duplicate_hashes))
+        for path, sidecar_file in zip(input_files, sidecar_files)
+    )
+
+
+def _shards(items: list, num_shards: int) -> list[list]:
+    size = max(1, -(-len(items) // num_shards))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def parallel_exact_line_deduplication(
+    input_files: list[str],
+    output_dir: str,
+    num_workers: int | None = None,
+    partition_bits: int | None = None,
+    shards_per_worker: int = 4,
+    tmp_dir: str | None = None,
+) -> None:
+    """run_exact_line_deduplication over a process pool, with output identical to the sequential run.
+
+    Workers hash shards of files and split their (hash, count) pairs into
+    2**partition_bits partitions by the top bits of the hash. Each partition
+    is merged by one worker into its sorted duplicated hashes. Because the
+    partitions are ranges of the hash space, concatenating them gives one
+    sorted array. The rewrite workers, forked after that, share it
+    copy-on-write and check each line's hash, read back from the sidecar
+    written by the map step, with a binary search.
+    """
+    global _duplicate_hashes
+    os.makedirs(output_dir, exist_ok=True)
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    if partition_bits is None:
+        partition_bits = max(0, (num_workers * shards_per_worker - 1).bit_length())
+    ctx = multiprocessing.get_context('fork')
+    num_shards = num_workers * shards_per_worker
+    shards = _shards(list(input_files), num_shards)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as sidecar_dir:
+        sidecar_shards = _shards(sidecar_paths(input_files, sidecar_dir), num_shards)
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as executor:
+            shard_partitions = list(executor.map(_hash_shard, shards, sidecar_shards, [partition_bits] * len(shards)))
+            by_partition = [[partitions[i] for partitions in shard_partitions] for i in range(2 ** partition_bits)]
+            del shard_partitions
+            duplicates = list(executor.map(_duplicates_in_partition, by_partition))
+        del by_partition
+
+        _duplicate_hashes = np.concatenate(duplicates or [np.zeros(0, np.uint64)])
+        try:
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as executor:
+                list(executor.map(_rewrite_shard, shards, sidecar_shards, [output_dir] * len(shards)))
+        finally:
+            _duplicate_hashes = np.zeros(0, dtype=np.uint64)
+
+
+class _RunWriter:
+    """Appends sorted (hash, count) pairs to a raw keys file and a raw uint8 counts file."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._keys = open(prefix + '.keys', 'wb')
+        self._counts = open(prefix + '.counts', 'wb')
+
+    def write(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        self._keys.write(keys.astype(np.uint64).tobytes())
+        self._counts.write(np.minimum(counts, 255).astype(np.uint8).tobytes())
+
+    def close(self) -> str:
+        self._keys.close()
+        self._counts.close()
+        return self.prefix
+
+
+def _merge_runs(run_prefixes: list[str], output_prefix: str, block_items: int, duplicates_only: bool) -> str:
+    """k-way merge of sorted runs, reading block_items of every run at a time.
+
+    Each round takes, from every run, the elements up to the smallest last
+    element among the blocks of runs that continue past their block, so equal
+    hashes from different runs always meet in the same round. Writes either
+    a merged run, or (duplicates_only) just the sorted hashes with count > 1.
+    """
+    keys = [_open_array(prefix + '.keys', np.uint64) for prefix in run_prefixes]
+    counts = [_open_array(prefix + '.counts', np.uint8) for prefix in run_prefixes]
+    positions = [0] * len(keys)
+    writer = _RunWriter(output_prefix)
+    while True:
+        blocks = [run[pos:pos + block_items] for run, pos in zip(keys, positions)]
+        if not any(len(block) for block in blocks):
+            break
+        continuing = [block[-1] for run, pos, block in zip(keys, positions, blocks) if pos + len(block) < len(run)]
+        bound = min(continuing) if continuing else None
+        taken_keys, taken_counts = [], []
+        for i, block in enumerate(blocks):
+            take = len(block) if bound is None else int(np.searchsorted(block, bound, side='right'))
+            taken_keys.append(block[:take])
+            taken_counts.append(counts[i][positions[i]:positions[i] + take])
+            positions[i] += take
+        unique, inverse = np.unique(np.concatenate(taken_keys), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(taken_counts), minlength=len(unique))
+        if duplicates_only:
+            writer.write(unique[totals > 1], np.zeros(0, dtype=np.uint8))
+        else:
+            writer.write(unique, totals)
+    del keys, counts
+    return writer.close()
+
+
+def external_exact_line_deduplication(
+    input_files: list[str],
+    output_dir: str,
+    memory_budget_bytes: int = 256 * 1024 * 1024,
+    tmp_dir: str | None = None,
+) -> dict[str, int]:
+    """Exact line dedup whose working memory stays within memory_budget_bytes, whatever the corpus size.
+
+    Pass one streams line hashes into a fixed buffer, also appending them to
+    each file's sidecar. Each time the buffer fills, its sorted unique hashes
+    and counts are spilled to a run file. The runs are
+    merged (in several levels if there are too many to merge at once) into
+    one sorted file of duplicated hashes. Pass two checks every sidecar hash
+    with a binary search over a memory map of that file. Returns the number of
+    runs, merge levels and duplicated hashes.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # The merge's np.unique(return_inverse=True) and bincount need ~10x the 8 bytes of each buffered hash
+    buffer_items = max(1024, memory_budget_bytes // EXTERNAL_BYTES_PER_HASH)
+    # A line in a batch costs its length plus ~40 bytes of bytes-object and list overhead
+    batch_bytes = max(4096, memory_budget_bytes // 16)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        runs = []
+        buffer = np.empty(buffer_items, dtype=np.uint64)
+        filled = 0
+
+        def spill(hashes: np.ndarray) -> None:
+            keys, counts = np.unique(hashes, return_counts=True)
+            writer = _RunWriter(os.path.join(tmp, f"run_{len(runs)}"))
+            writer.write(keys, counts)
+            runs.append(writer.close())
+
+        # First pass: spill sorted runs of line hashes
+        for i, input_file in enumerate(input_files):
+            with open(sidecar_path(tmp, i), 'wb') as f_sidecar:
+                for lines in iter_line_batches(input_file, batch_bytes):
+                    hashes = line_hashes(lines)
+                    f_sidecar.write(hashes.tobytes())
+                    while len(hashes):
+                        take = min(len(hashes), buffer_items - filled)
+                        buffer[filled:filled + take] = hashes[:take]
+                        filled += take
+                        hashes = hashes[take:]
+                        if filled == buffer_items:
+                            spill(buffer)
+                            filled = 0
+        if filled or not runs:
+            spill(buffer[:filled])
+        del buffer
+        num_runs = len(runs)
+
+        # Merge runs, at most fan_in at a time, until one pass can produce the duplicates
+        fan_in = max(2, buffer_items // MIN_MERGE_BLOCK)
+        levels = 0
+        while True:
+            levels += 1
+            if len(runs) <= fan_in:
+                duplicates = _merge_runs(runs, os.path.join(tmp, 'duplicates'), buffer_items // len(runs), True)
+                break
+            runs = [
+                _merge_runs(group, os.path.join(tmp, f"merge_{levels}_{i}"), buffer_items // len(group), False)
+                for i, group in enumerate(runs[j:j + fan_in] for j in range(0, len(runs), fan_in))
+            ]
+
+        # Second pass: binary search every sidecar hash in the memory-mapped duplicates
+        duplicate_hashes = _open_array(duplicates + '.keys', np.uint64)
+        for i, input_file in enumerate(input_files):
+            _write_kept_lines(
+                input_file, output_dir, sidecar_path(tmp, i),
+                lambda hashes: _not_in_sorted(hashes, duplicate_hashes), block_bytes=batch_bytes,
+            )
+    return {'runs': num_runs, 'duplicated_hashes': len(duplicate_hashes), 'merge_levels': levels}
+
+
+def run_exact_line_deduplication(
+    input_files: list[str],
+    output_dir: str,
+    num_workers: int = 1,
+    memory_budget_bytes: int | None = None,
+    tmp_dir: str | None = None,
+) -> None:
+    """Rewrite every file into output_dir keeping only the lines that occur exactly once in the whole corpus.
+
+    num_workers > 1 runs parallel_exact_line_deduplication, and a
+    memory_budget_bytes runs the out-of-core external_exact_line_deduplication.
+    Every mode keeps the line hashes of pass one in sidecar files under tmp_dir
+    (8 bytes per line), so pass two only copies bytes.
+    """
+
+    if memory_budget_bytes is not None:
+        external_exact_line_deduplication(input_files, output_dir, memory_budget_bytes, tmp_dir=tmp_dir)
+        return
+    if num_workers > 1:
+        return parallel_exact_line_deduplication(input_files, output_dir, num_workers, tmp_dir=tmp_dir)
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
-    line_hash_count = {}
-    
-    # First pass: Count frequency of each line using hashes
-    for input_file in input_files:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.rstrip('\n')
-                line_hash = hashlib.md5(line.encode('utf-8')).hexdigest()
-                line_hash_count[line_hash] = line_hash_count.get(line_hash, 0) + 1
-    
-    # Second pass: Rewrite each file with unique lines only
-    for input_file in input_files:
-        output_file_path = os.path.join(output_dir, os.path.basename(input_file))
-        with open(input_file, 'r', encoding='utf-8') as f_in, open(output_file_path, 'w', encoding='utf-8') as f_out:
-            for line in f_in:
-                line = line.rstrip('\n')
-                line_hash = hashlib.md5(line.encode('utf-8')).hexdigest()
-                if line_hash_count[line_hash] == 1:
-                    f_out.write(line + '\n')
-                    
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as sidecar_dir:
+        sidecar_files = sidecar_paths(input_files, sidecar_dir)
+
+        # First pass: Count frequency of each line using hashes
+        line_hash_count = count_line_hashes(input_files, sidecar_files)
+
+        # Second pass: Rewrite each file with unique lines only
+        for input_file, sidecar_file in zip(input_files, sidecar_files):
+            _write_kept_lines(input_file, output_dir, sidecar_file, lambda hashes: line_hash_count.get(hashes) == 1)
+
+
+class BloomFilter:
+    """Set membership of 64-bit hashes in a NumPy bit array, with false positives but no false negatives.
+
+    The num_hashes bit positions of a hash come from double hashing its two
+    32-bit halves, so no extra hashing of the line is needed.
+    """
+
+    def __init__(self, num_bytes: int, num_hashes: int):
+        self.bits = np.zeros(max(1, num_bytes), dtype=np.uint8)
+        self.num_bits = np.uint64(len(self.bits) * 8)
+        self.num_hashes = num_hashes
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (low[:, None] + steps[None, :] * high[:, None]) % self.num_bits
+
+    def add(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        positions = np.unique(self._positions(hashes))
+        byte_index = positions >> np.uint64(3)
+        bit_values = np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)
+        # Positions are sorted, so every byte's bits are one contiguous group to OR together
+        starts = np.flatnonzero(np.r_[True, byte_index[1:] != byte_index[:-1]])
+        self.bits[byte_index[starts]] |= np.bitwise_or.reduceat(bit_values, starts)
+
+    def __contains__(self, line_hash: int) -> bool:
+        return bool(self.contains(np.array([line_hash], dtype=np.uint64))[0])
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        positions = self._positions(hashes)
+        bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    def fill_ratio(self) -> float:
+        return float(np.unpackbits(self.bits).mean())
+
+    def false_positive_rate(self) -> float:
+        """Estimated probability that a hash never added is reported present: fill ratio ** num_hashes."""
+        return self.fill_ratio() ** self.num_hashes
+
+
+def bloom_capacity(num_bytes: int, error_rate: float) -> int:
+    """Distinct hashes a Bloom filter of num_bytes holds before exceeding error_rate (with optimal hash count)."""
+    return int(num_bytes * 8 * math.log(2) ** 2 / -math.log(error_rate))
+
+
+def run_approximate_line_deduplication(
+    input_files: list[str],
+    output_dir: str,
+    memory_bytes: int = 64 * 1024 * 1024,
+    error_rate: float = 1e-3,
+    tmp_dir: str | None = None,
+    batch_bytes: int = COPY_BLOCK_BYTES,
+) -> dict[str, float]:
+    """Line dedup in fixed memory that may drop a few unique lines, but never keeps a duplicated one.
+
+    Pass one adds every line hash to a "seen" Bloom filter, and every hash that
+    was already seen (or repeats within the batch) to a "seen twice" filter.
+    Pass two keeps the lines whose hash is not in "seen twice". Bloom filters
+    have no false negatives, so every duplicated line is removed. A unique line
+    is wrongly dropped only on a false positive of either filter. "seen" gets
+    two thirds of memory_bytes and "seen twice", which only holds duplicated
+    lines, the rest. Both use ceil(log2(1 / error_rate)) hash positions.
+
+    Returns the capacity of "seen" at error_rate, fill ratios, the estimated
+    probability of dropping a unique line (from the final fill ratios, so an
+    upper bound for lines seen early) and lines/sec.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    num_hashes = max(1, math.ceil(-math.log2(error_rate)))
+    seen = BloomFilter(memory_bytes * 2 // 3, num_hashes)
+    seen_twice = BloomFilter(memory_bytes - seen.nbytes, num_hashes)
+
+    start = time.perf_counter()
+    num_lines = 0
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as sidecar_dir:
+        # First pass: "seen" and "seen twice" filters, also keeping the hashes in sidecars
+        for i, input_file in enumerate(input_files):
+            with open(sidecar_path(sidecar_dir, i), 'wb') as f_sidecar:
+                for lines in iter_line_batches(input_file, batch_bytes):
+                    hashes = line_hashes(lines)
+                    f_sidecar.write(hashes.tobytes())
+                    num_lines += len(hashes)
+                    keys, counts = np.unique(hashes, return_counts=True)
+                    seen_twice.add(keys[(counts > 1) | seen.contains(keys)])
+                    seen.add(keys)
+
+        # Second pass: drop every line that may have been seen twice
+        for i, input_file in enumerate(input_files):
+            _write_kept_lines(
+                input_file, output_dir, sidecar_path(sidecar_dir, i),
+                lambda hashes: ~seen_twice.contains(hashes), block_bytes=batch_bytes,
+            )
+    seconds = time.perf_counter() - start
+
+    seen_rate, twice_rate = seen.false_positive_rate(), seen_twice.false_positive_rate()
+    return {
+        'num_hashes': num_hashes,
+        'capacity': bloom_capacity(seen.nbytes, error_rate),
+        'seen_fill_ratio': seen.fill_ratio(),
+        'seen_twice_fill_ratio': seen_twice.fill_ratio(),
+        'estimated_false_positive_rate': 1 - (1 - seen_rate) * (1 - twice_rate),
+        'lines_per_second': num_lines / max(seconds, 1e-9),
+    }
+
+
+def write_synthetic_corpus(
+    output_dir: str,
+    num_files: int,
+    lines_per_file: int = 100,
+    duplicate_fraction: float = 0.2,
+    seed: int = 0,
+) -> list[str]:
+    """Files of random lines where roughly duplicate_fraction of lines repeat a shared boilerplate line."""
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    boilerplate = [f"boilerplate line {i} shared across documents" for i in range(max(1, num_files // 10))]
+    paths = []
+    for i in range(num_files):
+        lines = [
+            rng.choice(boilerplate) if rng.random() < duplicate_fraction
+            else f"document {i} line {j} token {rng.getrandbits(48):x}"
+            for j in range(lines_per_file)
+        ]
+        path = os.path.join(output_dir, f"doc_{i}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        paths.append(path)
+    return paths
+
+
+def benchmark_line_counting(input_files: list[str]) -> dict[str, dict[str, float]]:
+    """Bytes per distinct line and lines/sec of the md5 dict versus LineHashCounter for the counting pass."""
+    report = {}
+
+    def md5_dict_count():
+        line_hash_count = {}
+        for input_file in input_files:
+            with open(input_file, encoding='utf-8') as f:
+                for line in f:
+                    line_hash = hashlib.md5(line.rstrip('\n').encode('utf-8')).hexdigest()
+                    line_hash_count[line_hash] = line_hash_count.get(line_hash, 0) + 1
+        return line_hash_count
+
+    start = time.perf_counter()
+    counts = md5_dict_count()
+    seconds = time.perf_counter() - start
+    num_lines, distinct = sum(counts.values()), len(counts)
+    # Memory is measured in a separate run since tracing slows the timed one down
+    del counts
+    tracemalloc.start()
+    counts = md5_dict_count()
+    num_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del counts
+    report['md5_dict'] = {
+        'distinct_lines': distinct,
+        'bytes_per_distinct_line': num_bytes / max(distinct, 1),
+        'lines_per_second': num_lines / max(seconds, 1e-9),
+    }
+
+    start = time.perf_counter()
+    counter = count_line_hashes(input_files)
+    seconds = time.perf_counter() - start
+    report['hash_table'] = {
+        'distinct_lines': len(counter),
+        'bytes_per_distinct_line': counter.nbytes / max(len(counter), 1),
+        'lines_per_second': num_lines / max(seconds, 1e-9),
+    }
+    return report
+
+
+def replicate_files(input_files: list[str], output_dir: str, copies: int) -> list[str]:
+    """copies renamed copies of every input file, e.g. to scale the test fixtures up to a benchmark corpus."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for copy in range(copies):
+        for input_file in input_files:
+            path = os.path.join(output_dir, f"{copy}_{os.path.basename(input_file)}")
+            shutil.copyfile(input_file, path)
+            paths.append(path)
+    return paths
+
+
+def benchmark_rewrite_pass(input_files: list[str], output_dir: str) -> dict[str, float]:
+    """MB/s of the second dedup pass when rehashing every line versus copying byte ranges with the sidecar hashes.
+
+    copy_only reads and writes every file unchanged, the I/O bound of the pass.
+    """
+    num_bytes = sum(os.path.getsize(path) for path in input_files)
+    report = {}
+    with tempfile.TemporaryDirectory() as sidecar_dir:
+        sidecar_files = sidecar_paths(input_files, sidecar_dir)
+        counter = count_line_hashes(input_files, sidecar_files)
+
+        copy_dir = os.path.join(output_dir, 'copy')
+        os.makedirs(copy_dir, exist_ok=True)
+        start = time.perf_counter()
+        for input_file in input_files:
+            with open(input_file, 'rb') as f_in, open(os.path.join(copy_dir, os.path.basename(input_file)), 'wb') as f_out:
+                f_out.write(f_in.read())
+        report['copy_only'] = num_bytes / 2**20 / (time.perf_counter() - start)
+
+        rehash_dir = os.path.join(output_dir, 'rehash')
+        os.makedirs(rehash_dir, exist_ok=True)
+        start = time.perf_counter()
+        for input_file in input_files:
+            lines = read_lines(input_file)
+            keep = counter.get(line_hashes(lines)) == 1
+            with open(os.path.join(rehash_dir, os.path.basename(input_file)), 'wb') as f_out:
+                f_out.writelines(line + b'\n' for line, kept in zip(lines, keep) if kept)
+        report['rehash'] = num_bytes / 2**20 / (time.perf_counter() - start)
+
+        sidecar_output_dir = os.path.join(output_dir, 'sidecar')
+        os.makedirs(sidecar_output_dir, exist_ok=True)
+        start = time.perf_counter()
+        for input_file, sidecar_file in zip(input_files, sidecar_files):
+            _write_kept_lines(input_file, sidecar_output_dir, sidecar_file, lambda hashes: counter.get(hashes) == 1)
+        report['sidecar'] = num_bytes / 2**20 / (time.perf_counter() - start)
+
+    if _output_digests(rehash_dir) != _output_digests(sidecar_output_dir):
+        raise RuntimeError("sidecar rewrite differs from the rehashing rewrite")
+    return report
+
+
+def _output_digests(run_dir: str) -> dict[str, str]:
+    outputs = {}
+    for name in sorted(os.listdir(run_dir)):
+        with open(os.path.join(run_dir, name), 'rb') as f:
+            outputs[name] = hashlib.md5(f.read()).hexdigest()
+    return outputs
+
+
+def benchmark_parallel_dedup(input_files: list[str], output_dir: str, worker_counts: list[int]) -> dict[int, float]:
+    """Lines/sec of exact line dedup per worker count (1 is the sequential path); checks the outputs match."""
+    num_lines = sum(len(read_lines(path)) for path in input_files)
+    report, reference = {}, None
+    for num_workers in worker_counts:
+        run_dir = os.path.join(output_dir, f"workers_{num_workers}")
+        start = time.perf_counter()
+        run_exact_line_deduplication(input_files, run_dir, num_workers=num_workers)
+        report[num_workers] = num_lines / (time.perf_counter() - start)
+
+        outputs = _output_digests(run_dir)
+        if reference is None:
+            reference = outputs
+        elif outputs != reference:
+            raise RuntimeError(f"{num_workers} workers produced different output from {worker_counts[0]}")
+    return report
+
+
+def benchmark_external_dedup(input_files: list[str], output_dir: str, budgets: list[int]) -> dict[int, dict]:
+    """Lines/sec, traced peak memory and merge levels of external dedup per memory budget.
+
+    Every output is checked against the in-memory sequential path.
+    """
+    num_lines = sum(len(read_lines(path)) for path in input_files)
+    reference_dir = os.path.join(output_dir, 'in_memory')
+    run_exact_line_deduplication(input_files, reference_dir)
+    reference = _output_digests(reference_dir)
+    report = {}
+    for budget in budgets:
+        run_dir = os.path.join(output_dir, f"budget_{budget}")
+        start = time.perf_counter()
+        stats = external_exact_line_deduplication(input_files, run_dir, budget)
+        seconds = time.perf_counter() - start
+        if _output_digests(run_dir) != reference:
+            raise RuntimeError(f"external dedup with a {budget} byte budget differs from the in-memory output")
+        # Memory is measured in a separate run since tracing slows the timed one down
+        tracemalloc.start()
+        external_exact_line_deduplication(input_files, run_dir, budget)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report[budget] = {'lines_per_second': num_lines / seconds, 'peak_bytes': peak, **stats}
+    return report
+
+
+def benchmark_approximate_dedup(
+    input_files: list[str], output_dir: str, settings: list[tuple[int, float]]
+) -> dict[tuple[int, float], dict]:
+    """Estimated and measured drop rate and lines/sec of approximate dedup per (memory_bytes, error_rate).
+
+    The measured drop rate is the fraction of lines kept by exact dedup that
+    the approximate run dropped; a kept duplicate raises an error.
+    """
+    exact_dir = os.path.join(output_dir, 'exact')
+    start = time.perf_counter()
+    run_exact_line_deduplication(input_files, exact_dir)
+    exact_lines_per_second = sum(len(read_lines(path)) for path in input_files) / (time.perf_counter() - start)
+    exact = {name: read_lines(os.path.join(exact_dir, name)) for name in os.listdir(exact_dir)}
+    exact_kept = sum(len(lines) for lines in exact.values())
+
+    report = {'exact': {'lines_per_second': exact_lines_per_second}}
+    for memory_bytes, error_rate in settings:
+        run_dir = os.path.join(output_dir, f"approximate_{memory_bytes}_{error_rate}")
+        stats = run_approximate_line_deduplication(input_files, run_dir, memory_bytes, error_rate)
+        kept = 0
+        for name, lines in exact.items():
+            approximate = read_lines(os.path.join(run_dir, name))
+            if not set(approximate) <= set(lines):
+                raise RuntimeError(f"approximate dedup kept a duplicated line in {name}")
+            kept += len(approximate)
+        report[(memory_bytes, error_rate)] = {**stats, 'measured_drop_rate': 1 - kept / max(exact_kept, 1)}
+    return report
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        paths = write_synthetic_corpus(corpus_dir, num_files=2000, lines_per_file=500)
+        for name, stats in benchmark_line_counting(paths).items():
+            print(f"{name:>10}: {stats['distinct_lines']:,} distinct lines, "
+                  f"{stats['bytes_per_distinct_line']:.1f} bytes/distinct line, "
+                  f"{stats['lines_per_second']:,.0f} lines/sec")
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, mb_per_second in benchmark_rewrite_pass(paths, work_dir).items():
+                print(f"rewrite pass {name:>9}: {mb_per_second:,.0f} MB/s")
+        with tempfile.TemporaryDirectory() as work_dir:
+            report = benchmark_approximate_dedup(paths, work_dir, [(1 << 20, 1e-2), (4 << 20, 1e-3), (16 << 20, 1e-4)])
+            print(f"exact dedup: {report.pop('exact')['lines_per_second']:,.0f} lines/sec")
+            for (memory_bytes, error_rate), stats in report.items():
+                print(f"bloom {memory_bytes / 2**20:>3.0f} MiB, p={error_rate:g}: k={stats['num_hashes']}, "
+                      f"capacity {stats['capacity']:,}, estimated drop {stats['estimated_false_positive_rate']:.2e}, "
+                      f"measured drop {stats['measured_drop_rate']:.2e}, {stats['lines_per_second']:,.0f} lines/sec")
+        budgets = [1 << 20, 16 << 20, 256 << 20]
+        with tempfile.TemporaryDirectory() as work_dir:
+            for budget, stats in benchmark_external_dedup(paths, work_dir, budgets).items():
+                print(f"budget {budget / 2**20:>5.0f} MiB: peak {stats['peak_bytes'] / 2**20:.1f} MiB, "
+                      f"{stats['merge_levels']} merge levels, {stats['lines_per_second']:,.0f} lines/sec")
+
+    fixtures = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'documents_with_line_duplicates')
+    fixture_files = sorted(os.path.join(fixtures, name) for name in os.listdir(fixtures))
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = replicate_files(fixture_files, os.path.join(work_dir, 'corpus'), copies=1000)
+        worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+        for num_workers, lines_per_second in benchmark_parallel_dedup(paths, work_dir, worker_counts).items():
+            print(f"{num_workers:>3} workers: {lines_per_second:,.0f} lines/sec on {len(paths)} files")
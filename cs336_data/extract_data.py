@@ -1,4 +1,16 @@
-from fastwarc.warc import ArchiveIterator, WarcRecordType
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from fastwarc.warc import ArchiveIterator, WarcRecord, WarcRecordType
 
 def run_extract_text_from_html_bytes(html_bytes: bytes) -> str:
     from resiliparse.extract.html2text import extract_plain_text
@@ -11,48 +23,563 @@ def run_extract_text_from_html_bytes(html_bytes: bytes) -> str:
         html_str = html_bytes.decode(encoding, errors='replace')
     return extract_plain_text(html_str)
 
-def extract_texts_from_warc(warc_path: str) -> list[str]:
-    texts = []
+
+# Responses we hand to resiliparse; everything else (images, PDFs, JS, ...) is skipped unread
+HTML_CONTENT_TYPES = frozenset({'text/html', 'application/xhtml+xml'})
+# Common Crawl truncates payloads at 1 MiB, so anything far above that is not a normal page
+MAX_HTML_BYTES = 5 * 1024 * 1024
+
+
+class DigestSet:
+    """In-memory set of WARC payload digests with an optional size bound.
+
+    Once max_size digests are held the oldest are evicted first, so memory stays
+    bounded at the cost of missing duplicates that are far apart in the crawl.
+    """
+
+    def __init__(self, max_size: int | None = 10_000_000):
+        self.max_size = max_size
+        # dicts keep insertion order, which gives FIFO eviction for free
+        self._digests: dict[str, None] = {}
+
+    def add(self, digest: str) -> bool:
+        """Add digest; return True if it had not been seen before."""
+        if digest in self._digests:
+            return False
+        if self.max_size is not None and len(self._digests) >= self.max_size:
+            del self._digests[next(iter(self._digests))]
+        self._digests[digest] = None
+        return True
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._digests
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
+class DiskDigestSet:
+    """SQLite-backed set of payload digests, shared across shards, runs and worker processes.
+
+    The connection is in autocommit mode, so every insert is its own short
+    transaction: SQLite's single writer lock is only held for the duration of
+    one statement and other processes see each digest as soon as it is added.
+    Each digest records the owner that added it (the shard being extracted), so
+    the digests of a shard that failed can be withdrawn with discard_owner. The
+    connection may be used from any one thread at a time, e.g. the readahead
+    producer thread.
+    """
+
+    def __init__(self, path: str, owner: str | None = None):
+        self.path = path
+        self.owner = owner
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS digests (digest TEXT PRIMARY KEY, owner TEXT) WITHOUT ROWID')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS digests_owner ON digests (owner)')
+
+    def add(self, digest: str) -> bool:
+        """Add digest; return True if it had not been seen before."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO digests (digest, owner) VALUES (?, ?)', (digest, self.owner)
+            )
+        return cursor.rowcount == 1
+
+    def discard_owner(self, owner: str | None = None) -> int:
+        """Remove every digest added by owner (default: this set's owner); returns how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM digests WHERE owner = ?', (owner or self.owner,))
+        return cursor.rowcount
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM digests WHERE digest = ?', (digest,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'DiskDigestSet':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_html_payloads(
+    records: Iterator[WarcRecord],
+    max_content_length: int | None = MAX_HTML_BYTES,
+    skipped: Counter | None = None,
+    seen_digests: DigestSet | DiskDigestSet | None = None,
+) -> Iterator[tuple[str, str, bytes]]:
+    """Yield (record_id, url, html_bytes) from HTTP-parsed response records, skipping non-HTML and oversized bodies.
+
+    If seen_digests is given, records whose WARC-Payload-Digest is already in it are
+    skipped as byte-identical duplicates before their payload is read.
+    """
+    if skipped is None:
+        skipped = Counter()
+    for record in records:
+        if not record.is_http:
+            skipped['not_http'] += 1
+            continue
+        # Keep responses without a Content-Type header; resiliparse copes with non-HTML text
+        content_type = record.http_content_type
+        if content_type is not None and content_type.lower() not in HTML_CONTENT_TYPES:
+            skipped['not_html'] += 1
+            continue
+        # After HTTP parsing content_length is the body length
+        if max_content_length is not None and record.content_length > max_content_length:
+            skipped['too_large'] += 1
+            continue
+        if seen_digests is not None:
+            digest = record.headers.get('WARC-Payload-Digest')
+            if digest is not None and not seen_digests.add(digest):
+                skipped['duplicate_digest'] += 1
+                continue
+
+        html_bytes = record.reader.read()
+        if not html_bytes:
+            skipped['empty'] += 1
+            continue
+
+        yield record.record_id, record.headers.get('WARC-Target-URI'), html_bytes
+
+
+def readahead(items: Iterator, buffer_size: int) -> Iterator:
+    """Run an iterator in a background thread, buffering up to buffer_size items ahead of the consumer.
+
+    Used to overlap WARC decompression and disk/network reads with HTML extraction.
+    Exceptions raised by the producer are re-raised in the consumer; closing the
+    returned generator early stops the producer.
+    """
+    buffer = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
+            return
+        put((done, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def iter_texts_from_records(
+    records: Iterator[WarcRecord],
+    max_content_length: int | None = MAX_HTML_BYTES,
+    skipped: Counter | None = None,
+    readahead_records: int = 0,
+    seen_digests: DigestSet | DiskDigestSet | None = None,
+) -> Iterator[tuple[str, str, str]]:
+    """Extract (record_id, url, text) from HTTP-parsed response records.
+
+    With readahead_records > 0, records are read and decompressed in a background
+    thread up to that many payloads ahead of the extraction.
+    """
+    payloads = iter_html_payloads(records, max_content_length, skipped, seen_digests)
+    if readahead_records > 0:
+        payloads = readahead(payloads, readahead_records)
+    for record_id, url, html_bytes in payloads:
+        yield record_id, url, run_extract_text_from_html_bytes(html_bytes)
+
+
+def iter_texts_from_warc(
+    warc_path: str,
+    max_content_length: int | None = MAX_HTML_BYTES,
+    skipped: Counter | None = None,
+    readahead_records: int = 0,
+    seen_digests: DigestSet | DiskDigestSet | None = None,
+) -> Iterator[tuple[str, str, str]]:
+    """Lazily yield (record_id, url, text) for every HTML response in a WARC file.
+
+    fastwarc parses the HTTP headers, so the reader is positioned at the body and
+    only the body is read. Records that are not HTML or whose body is larger than
+    max_content_length are skipped without reading the payload. Pass a Counter as
+    skipped to collect per-reason skip counts, readahead_records > 0 to
+    decompress that many records ahead in a background thread, and a DigestSet
+    or DiskDigestSet as seen_digests to drop byte-identical payloads before
+    extraction (pass the same set across files to dedup across shards).
+    """
     with open(warc_path, 'rb') as f:
-        for record in ArchiveIterator(f):
-            # Use record.record_type for fastwarc
-            if record.record_type == WarcRecordType.response:
-                # Use record.reader.read() for fastwarc
-                content = record.reader.read()
-                
-                # Skip HTTP headers (separated by \r\n\r\n)
-                if b'\r\n\r\n' in content:
-                    html_bytes = content.split(b'\r\n\r\n', 1)[1]
-                else:
-                    html_bytes = content
-                
-                if html_bytes:
-                    text = run_extract_text_from_html_bytes(html_bytes)
-                    texts.append(text)
-    return texts
+        records = ArchiveIterator(f, record_types=WarcRecordType.response, parse_http=True)
+        yield from iter_texts_from_records(records, max_content_length, skipped, readahead_records, seen_digests)
 
 
-def extract_texts_from_wet(wet_path: str) -> list[str]:
-    texts = []
+def iter_texts_from_wet(wet_path: str) -> Iterator[tuple[str, str, str]]:
+    """Lazily yield (record_id, url, text) for every conversion record in a WET file."""
     with open(wet_path, 'rb') as f:
-        for record in ArchiveIterator(f):
-            if record.record_type == WarcRecordType.conversion:
-                text = record.reader.read().decode('utf-8', errors='replace')
-                texts.append(text)
-    return texts
+        for record in ArchiveIterator(f, record_types=WarcRecordType.conversion):
+            text = record.reader.read().decode('utf-8', errors='replace')
+            yield record.record_id, record.headers.get('WARC-Target-URI'), text
+
+
+def extract_texts_from_warc(warc_path: str) -> list[str]:
+    return [text for _, _, text in iter_texts_from_warc(warc_path)]
+
+
+def extract_texts_from_wet(wet_path: str) -> list[str]:
+    return [text for _, _, text in iter_texts_from_wet(wet_path)]
+
+
+WARC_INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('length', '<u8'),
+    ('record_type', '<u4'),
+])
+
+
+class WarcIndex:
+    """Byte-offset index of the records in one WARC file.
+
+    Offsets, lengths and record types live in a structured array; URLs and payload
+    digests are stored as concatenated UTF-8 blobs with an (n + 1) offsets array, so
+    the sidecar stays compact and every lookup is O(1). For gzipped WARCs the
+    offsets point at the per-record gzip members, so seeking to them is valid.
+    """
+
+    def __init__(
+        self,
+        warc_path: str,
+        records: np.ndarray,
+        url_data: np.ndarray,
+        url_offsets: np.ndarray,
+        digest_data: np.ndarray,
+        digest_offsets: np.ndarray,
+    ):
+        self.warc_path = warc_path
+        self.records = records
+        self.url_data = url_data
+        self.url_offsets = url_offsets
+        self.digest_data = digest_data
+        self.digest_offsets = digest_offsets
+
+    @staticmethod
+    def sidecar_path(warc_path: str) -> str:
+        return warc_path + '.idx.npz'
+
+    @classmethod
+    def build(cls, warc_path: str) -> 'WarcIndex':
+        """Scan a WARC once and index every record (headers only, payloads are not read)."""
+        offsets, types, urls, digests = [], [], [], []
+        with open(warc_path, 'rb') as f:
+            for record in ArchiveIterator(f):
+                offsets.append(record.stream_pos)
+                types.append(int(record.record_type))
+                urls.append((record.headers.get('WARC-Target-URI') or '').encode('utf-8'))
+                digests.append((record.headers.get('WARC-Payload-Digest') or '').encode('utf-8'))
+
+        records = np.zeros(len(offsets), dtype=WARC_INDEX_DTYPE)
+        records['offset'] = offsets
+        records['record_type'] = types
+        # A record ends where the next one starts; the last one runs to the end of the file
+        ends = np.append(records['offset'][1:], os.path.getsize(warc_path))
+        records['length'] = ends - records['offset']
+
+        def pack(strings: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
+            string_offsets = np.zeros(len(strings) + 1, dtype=np.uint64)
+            np.cumsum([len(string) for string in strings], out=string_offsets[1:])
+            return np.frombuffer(b''.join(strings), dtype=np.uint8), string_offsets
+
+        return cls(warc_path, records, *pack(urls), *pack(digests))
+
+    def save(self, index_path: str | None = None) -> str:
+        index_path = index_path or self.sidecar_path(self.warc_path)
+        # Write through a file object so numpy does not append another .npz suffix
+        with open(index_path, 'wb') as f:
+            np.savez(
+                f,
+                records=self.records,
+                url_data=self.url_data,
+                url_offsets=self.url_offsets,
+                digest_data=self.digest_data,
+                digest_offsets=self.digest_offsets,
+            )
+        return index_path
+
+    @classmethod
+    def load(cls, warc_path: str, index_path: str | None = None) -> 'WarcIndex':
+        with np.load(index_path or cls.sidecar_path(warc_path)) as data:
+            return cls(
+                warc_path,
+                data['records'],
+                data['url_data'],
+                data['url_offsets'],
+                data['digest_data'],
+                data['digest_offsets'],
+            )
+
+    @classmethod
+    def load_or_build(cls, warc_path: str) -> 'WarcIndex':
+        """Load the sidecar index if present, otherwise build and save it."""
+        if os.path.exists(cls.sidecar_path(warc_path)):
+            return cls.load(warc_path)
+        index = cls.build(warc_path)
+        index.save()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def url(self, i: int) -> str:
+        return self.url_data[self.url_offsets[i]:self.url_offsets[i + 1]].tobytes().decode('utf-8')
+
+    def digest(self, i: int) -> str:
+        return self.digest_data[self.digest_offsets[i]:self.digest_offsets[i + 1]].tobytes().decode('utf-8')
+
+    def record_type(self, i: int) -> int:
+        """WarcRecordType flag of record i as an int, e.g. compare with int(WarcRecordType.response)."""
+        return int(self.records['record_type'][i])
+
+    def read_record_bytes(self, i: int) -> bytes:
+        """Raw (possibly gzipped) bytes of record i, read with a single seek."""
+        with open(self.warc_path, 'rb') as f:
+            f.seek(int(self.records['offset'][i]))
+            return f.read(int(self.records['length'][i]))
+
+    def iter_texts(
+        self,
+        start: int = 0,
+        stop: int | None = None,
+        max_content_length: int | None = MAX_HTML_BYTES,
+        skipped: Counter | None = None,
+        readahead_records: int = 0,
+        seen_digests: DigestSet | DiskDigestSet | None = None,
+    ) -> Iterator[tuple[str, str, str]]:
+        """Like iter_texts_from_warc, but only for records [start, stop) of the file."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return
+        start_offset = int(self.records['offset'][start])
+        end_offset = int(self.records['offset'][stop - 1] + self.records['length'][stop - 1])
+
+        def records_in_range(f):
+            for record in ArchiveIterator(f, record_types=WarcRecordType.response, parse_http=True):
+                if record.stream_pos >= end_offset:
+                    break
+                yield record
+
+        with open(self.warc_path, 'rb') as f:
+            f.seek(start_offset)
+            yield from iter_texts_from_records(
+                records_in_range(f), max_content_length, skipped, readahead_records, seen_digests
+            )
+
+    def split(self, num_shards: int) -> list[tuple[int, int]]:
+        """Split the records into num_shards contiguous [start, stop) ranges of roughly equal bytes."""
+        total = int(self.records['offset'][-1] + self.records['length'][-1]) if len(self) else 0
+        targets = [total * k // num_shards for k in range(1, num_shards)]
+        bounds = [0, *np.searchsorted(self.records['offset'], targets).tolist(), len(self)]
+        return [(bounds[k], bounds[k + 1]) for k in range(num_shards)]
+
+
+def warc_output_path(warc_path: str, output_dir: str) -> str:
+    """Output shard path for a WARC file: <output_dir>/<basename without .warc[.gz]>.jsonl"""
+    name = os.path.basename(warc_path)
+    for suffix in ('.gz', '.warc'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return os.path.join(output_dir, name + '.jsonl')
+
+
+def shard_output_paths(warc_paths: list[str], output_dir: str) -> dict[str, str]:
+    """warc_output_path of every input, with a hash of the full path appended where two inputs share a file name."""
+    paths = {warc_path: warc_output_path(warc_path, output_dir) for warc_path in warc_paths}
+    inputs_by_output = {}
+    for warc_path, output_path in paths.items():
+        inputs_by_output.setdefault(output_path, set()).add(os.path.abspath(warc_path))
+    for warc_path, output_path in paths.items():
+        if len(inputs_by_output[output_path]) > 1:
+            digest = hashlib.sha1(os.path.abspath(warc_path).encode('utf-8')).hexdigest()[:10]
+            paths[warc_path] = f"{output_path[:-len('.jsonl')]}-{digest}.jsonl"
+    return paths
+
+
+def extract_warc_to_shard(warc_path: str, output_path: str, digest_db: str | None = None) -> dict:
+    """Extract one WARC into a JSONL shard of {id, url, text} documents.
+
+    If digest_db is given, payloads whose digest is already in that DiskDigestSet
+    (from this or any other shard) are dropped before extraction. The digests
+    this shard adds are owned by warc_path. They are withdrawn if the shard
+    fails, and also before it starts, in case an earlier attempt was killed
+    before it could clean up, so a rerun never drops its own documents.
+    """
+    start = time.perf_counter()
+    num_docs = 0
+    skipped = Counter()
+    seen_digests = DiskDigestSet(digest_db, owner=warc_path) if digest_db is not None else None
+    if seen_digests is not None:
+        # Only unfinished shards are (re)run, so any digests they own are stale
+        seen_digests.discard_owner()
+    # Write to a temp file first so a killed worker never leaves a partial shard behind
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record_id, url, text in iter_texts_from_warc(warc_path, skipped=skipped, seen_digests=seen_digests):
+                f.write(json.dumps({'id': record_id, 'url': url, 'text': text}) + '\n')
+                num_docs += 1
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if seen_digests is not None:
+            seen_digests.discard_owner()
+        raise
+    finally:
+        if seen_digests is not None:
+            seen_digests.close()
+    return {
+        'input': warc_path,
+        'output': output_path,
+        'num_docs': num_docs,
+        'skipped': dict(skipped),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def read_manifest(manifest_path: str) -> dict[str, dict]:
+    """Map input path -> manifest entry for every shard already finished."""
+    done = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Truncated last line from an interrupted run
+                    continue
+                done[entry['input']] = entry
+    return done
+
+
+def extract_warcs_parallel(
+    warc_paths: list[str],
+    output_dir: str,
+    num_workers: int | None = None,
+    manifest_path: str | None = None,
+    digest_db: str | None = None,
+) -> list[dict]:
+    """Extract many WARC files over a process pool, one output shard per input.
+
+    Finished shards are appended to a manifest (default <output_dir>/manifest.jsonl);
+    shards already listed there with an existing output file are skipped, so a
+    restarted job only redoes unfinished work. Inputs with the same file name in
+    different directories get distinct shards (see shard_output_paths). Returns
+    one stats entry per input, in input order. If any shard fails, the others
+    still finish and are recorded, and then a RuntimeError naming the failed
+    inputs is raised. Pass digest_db (a DiskDigestSet path) to drop byte-identical
+    payloads across all shards; which copy is kept then depends on scheduling.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    done = read_manifest(manifest_path)
+    output_paths = shard_output_paths(warc_paths, output_dir)
+    results = {}
+    pending = []
+    for warc_path in output_paths:
+        entry = done.get(warc_path)
+        if entry is not None and entry['output'] == output_paths[warc_path] and os.path.exists(entry['output']):
+            results[warc_path] = entry
+        else:
+            pending.append(warc_path)
+
+    if done:
+        print(f"[CACHED] {len(results)}/{len(warc_paths)} shards already in {manifest_path}")
+
+    start = time.perf_counter()
+    new_docs = 0
+    failures = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor, \
+                open(manifest_path, 'a', encoding='utf-8') as manifest:
+            futures = {
+                executor.submit(extract_warc_to_shard, warc_path, output_paths[warc_path], digest_db): warc_path
+                for warc_path in pending
+            }
+            for future in as_completed(futures):
+                warc_path = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    failures[warc_path] = e
+                    # A worker that died outright never got to remove its partial shard
+                    tmp_path = output_paths[warc_path] + '.tmp'
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    continue
+                manifest.write(json.dumps(entry) + '\n')
+                manifest.flush()
+                results[warc_path] = entry
+                new_docs += entry['num_docs']
+
+        elapsed = time.perf_counter() - start
+        print(f"Extracted {new_docs} documents from {len(pending)} shards with {num_workers} workers "
+              f"in {elapsed:.1f}s ({new_docs / max(elapsed, 1e-9):.1f} docs/sec)")
+        skipped = sum((Counter(results[p].get('skipped', {})) for p in pending if p in results), Counter())
+        if skipped:
+            print(f"Skipped records: {dict(skipped)}")
+
+    if failures:
+        first = next(iter(failures.values()))
+        raise RuntimeError(
+            f"failed to extract {len(failures)} of {len(pending)} shards: "
+            + ', '.join(f"{path} ({error!r})" for path, error in failures.items())
+        ) from first
+    return [results[warc_path] for warc_path in warc_paths]
 
 
 if __name__ == "__main__":
+    from itertools import islice
+
     warc_path = "CC-MAIN-20241201162023-20241201192023-00000.warc"
     wet_path = "CC-MAIN-20241201162023-20241201192023-00000.warc.wet"
     
-    warc_texts = extract_texts_from_warc(warc_path)
-    wet_texts = extract_texts_from_wet(wet_path)
+    warc_texts = iter_texts_from_warc(warc_path)
+    wet_texts = iter_texts_from_wet(wet_path)
     
-    for i in range(2):
+    for i, ((_, warc_url, warc_text), (_, wet_url, wet_text)) in enumerate(islice(zip(warc_texts, wet_texts), 2)):
         print(f"{'='*60}")
         print(f"Document {i+1}")
-        print(f"--- Our Extraction (WARC) ---")
-        print(warc_texts[i][:500])
-        print(f"\n--- Common Crawl (WET) ---")
-        print(wet_texts[i][:500])
\ No newline at end of file
+        print(f"--- Our Extraction (WARC) {warc_url} ---")
+        print(warc_text[:500])
+        print(f"\n--- Common Crawl (WET) {wet_url} ---")
+        print(wet_text[:500])
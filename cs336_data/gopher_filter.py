@@ -1,38 +1,292 @@
+import mmh3
 import nltk
-from cs336_data.extract_data import extract_texts_from_warc
+import re
+from dataclasses import dataclass
+from itertools import islice
+from typing import NamedTuple
+import numpy as np
+from cs336_data.extract_data import iter_texts_from_warc
 import random
 
-def run_gopher_quality_filter(text: str) -> bool:
+MIN_WORDS = 50
+MAX_WORDS = 100000
+MIN_MEAN_WORD_LENGTH = 3
+MAX_MEAN_WORD_LENGTH = 10
+MAX_ELLIPSIS_LINE_FRACTION = 0.3
+MIN_ALPHABETIC_WORD_FRACTION = 0.8
+
+# Approximates nltk.word_tokenize: word runs (keeping internal hyphens/periods/commas),
+# clitics such as 's and 't, and runs of punctuation. Tokens partition the non-whitespace
+# characters, so the total token length is just the non-whitespace character count.
+FAST_WORD_PATTERN = re.compile(r"\w+(?:[-.,]\w+)*|'\w+|[^\w\s]+")
+
+def _fast_words(text: str, max_words: int) -> list[str] | None:
+    """Tokenize with FAST_WORD_PATTERN, or return None as soon as there are more than max_words tokens."""
+    if len(text) <= max_words:
+        # Every token is at least one character, so the bound cannot be crossed
+        return FAST_WORD_PATTERN.findall(text)
+    matches = list(islice(FAST_WORD_PATTERN.finditer(text), max_words + 1))
+    if len(matches) > max_words:
+        return None
+    return [match.group() for match in matches]
+
+def _ellipsis_fraction_ok(text: str) -> bool:
+    lines = text.splitlines()
+    if len(lines) > 0:
+        ellipsis_lines = sum(1 for line in lines if line.strip().endswith("..."))
+        if (ellipsis_lines / len(lines)) > MAX_ELLIPSIS_LINE_FRACTION:
+            return False
+    return True
+
+def _alphabetic_fraction_ok(words: list[str]) -> bool:
+    # isalpha() settles the common all-letter word without a per-character loop
+    alphabetic_words = sum(1 for word in words if word.isalpha() or any(c.isalpha() for c in word))
+    return (alphabetic_words / len(words)) >= MIN_ALPHABETIC_WORD_FRACTION
+
+def run_gopher_quality_filter(text: str, fast: bool = False) -> bool:
+    """Gopher quality rules: word count, mean word length, ellipsis lines and alphabetic words.
+
+    Checks run cheapest first and return at the first failure. With fast=True,
+    words come from FAST_WORD_PATTERN instead of nltk.word_tokenize: documents too
+    short to hold MIN_WORDS words are rejected from len(text) alone, nothing else
+    scans the whole text before tokenization, and tokenization stops as soon as
+    MAX_WORDS is exceeded.
+    """
+    # Every word has at least one character
+    if len(text) < MIN_WORDS:
+        return False
+
+    if fast:
+        # Fast tokens partition the non-whitespace characters, so len(text) bounds their total
+        # length, and MIN_WORDS words of MIN_MEAN_WORD_LENGTH need at least this many characters
+        if len(text) < MIN_WORDS * MIN_MEAN_WORD_LENGTH:
+            return False
+        if not _ellipsis_fraction_ok(text):
+            return False
+        words = _fast_words(text, MAX_WORDS)
+        if words is None:
+            return False
+        num_words = len(words)
+        if num_words < MIN_WORDS:
+            return False
+        mean_word_length = sum(map(len, words)) / num_words
+        if mean_word_length < MIN_MEAN_WORD_LENGTH or mean_word_length > MAX_MEAN_WORD_LENGTH:
+            return False
+        return _alphabetic_fraction_ok(words)
+
+    if not _ellipsis_fraction_ok(text):
+        return False
+
     words = nltk.word_tokenize(text)
     num_words = len(words)
-    if num_words < 50 or num_words > 100000:
+    if num_words < MIN_WORDS or num_words > MAX_WORDS:
         return False
 
     mean_word_length = sum(len(word) for word in words) / num_words
-    if mean_word_length < 3 or mean_word_length > 10:
+    if mean_word_length < MIN_MEAN_WORD_LENGTH or mean_word_length > MAX_MEAN_WORD_LENGTH:
         return False
 
+    return _alphabetic_fraction_ok(words)
+
+# Full Gopher rule set (Rae et al., 2021, Appendix A), computed from a GopherStats record
+STOP_WORDS = frozenset({'the', 'be', 'to', 'of', 'and', 'that', 'have', 'with'})
+BULLETS = ('•', '‣', '●', '▪', '◦', '-', '*')
+TOP_NGRAM_SIZES = (2, 3, 4)
+DUPLICATE_NGRAM_SIZES = (5, 6, 7, 8, 9, 10)
+# Odd 64-bit multiplier for the polynomial rolling hash over word hashes
+_NGRAM_HASH_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+
+class GopherStats(NamedTuple):
+    """Every statistic the Gopher quality and repetition rules need, for one document.
+
+    A plain tuple of numbers, so lists of these convert straight into a
+    GOPHER_STATS_DTYPE array for offline threshold tuning.
+    """
+    num_words: int
+    mean_word_length: float
+    symbol_to_word_ratio: float
+    bullet_line_fraction: float
+    ellipsis_line_fraction: float
+    alphabetic_word_fraction: float
+    num_stop_words: int
+    duplicate_line_fraction: float
+    duplicate_line_char_fraction: float
+    duplicate_paragraph_fraction: float
+    duplicate_paragraph_char_fraction: float
+    top_2gram_char_fraction: float
+    top_3gram_char_fraction: float
+    top_4gram_char_fraction: float
+    duplicate_5gram_char_fraction: float
+    duplicate_6gram_char_fraction: float
+    duplicate_7gram_char_fraction: float
+    duplicate_8gram_char_fraction: float
+    duplicate_9gram_char_fraction: float
+    duplicate_10gram_char_fraction: float
+
+
+GOPHER_STATS_DTYPE = np.dtype([
+    (name, np.int64 if name in ('num_words', 'num_stop_words') else np.float32) for name in GopherStats._fields
+])
+
+
+@dataclass
+class GopherThresholds:
+    min_words: int = MIN_WORDS
+    max_words: int = MAX_WORDS
+    min_mean_word_length: float = MIN_MEAN_WORD_LENGTH
+    max_mean_word_length: float = MAX_MEAN_WORD_LENGTH
+    max_symbol_to_word_ratio: float = 0.1
+    max_bullet_line_fraction: float = 0.9
+    max_ellipsis_line_fraction: float = MAX_ELLIPSIS_LINE_FRACTION
+    min_alphabetic_word_fraction: float = MIN_ALPHABETIC_WORD_FRACTION
+    min_stop_words: int = 2
+    max_duplicate_line_fraction: float = 0.3
+    max_duplicate_line_char_fraction: float = 0.2
+    max_duplicate_paragraph_fraction: float = 0.3
+    max_duplicate_paragraph_char_fraction: float = 0.2
+    max_top_ngram_char_fraction: tuple[float, ...] = (0.2, 0.18, 0.16)
+    max_duplicate_ngram_char_fraction: tuple[float, ...] = (0.15, 0.14, 0.13, 0.12, 0.11, 0.10)
+
+
+def _duplicate_fractions(items: list[str]) -> tuple[float, float]:
+    """Fraction of items that repeat an earlier item, and the fraction of characters in them."""
+    seen = set()
+    duplicates = duplicate_chars = total_chars = 0
+    for item in items:
+        total_chars += len(item)
+        if item in seen:
+            duplicates += 1
+            duplicate_chars += len(item)
+        else:
+            seen.add(item)
+    return duplicates / max(len(items), 1), duplicate_chars / max(total_chars, 1)
+
+
+def _ngram_char_fractions(words: list[str]) -> tuple[list[float], list[float]]:
+    """Top n-gram and duplicated n-gram character fractions from rolling hashes over word hashes.
+
+    n-gram hashes are built incrementally, H_n[i] = H_(n-1)[i] * B + h[i + n - 1] (mod 2**64),
+    so no n-gram strings are materialized and each n costs one vectorized pass. Word
+    hashes are MurmurHash3 rather than the per-process randomized hash(), and when
+    several n-grams share the top count the longest one is used, so the result is the
+    same in every process.
+    """
+    num_words = len(words)
+    word_hashes = np.fromiter((mmh3.hash64(word)[0] for word in words), dtype=np.int64, count=num_words).view(np.uint64)
+    lengths = np.fromiter((len(word) for word in words), dtype=np.int64, count=num_words)
+    char_offsets = np.concatenate(([0], np.cumsum(lengths)))
+    total_chars = max(int(char_offsets[-1]), 1)
+
+    top_fractions, duplicate_fractions = [], []
+    ngram_hashes = word_hashes.copy()
+    with np.errstate(over='ignore'):
+        for n in range(2, max(DUPLICATE_NGRAM_SIZES) + 1):
+            if num_words < n:
+                ngram_hashes = ngram_hashes[:0]
+            else:
+                ngram_hashes = ngram_hashes[:num_words - n + 1] * _NGRAM_HASH_BASE + word_hashes[n - 1:]
+            if len(ngram_hashes) == 0:
+                if n in TOP_NGRAM_SIZES:
+                    top_fractions.append(0.0)
+                else:
+                    duplicate_fractions.append(0.0)
+                continue
+
+            _, first_index, inverse, counts = np.unique(
+                ngram_hashes, return_index=True, return_inverse=True, return_counts=True
+            )
+            if n in TOP_NGRAM_SIZES:
+                top_count = counts.max()
+                top_starts = first_index[counts == top_count]
+                ngram_chars = int((char_offsets[top_starts + n] - char_offsets[top_starts]).max())
+                top_fractions.append(int(top_count) * ngram_chars / total_chars)
+            else:
+                # Mark every word covered by an n-gram that occurs more than once
+                starts = np.flatnonzero(counts[inverse] > 1)
+                coverage = np.zeros(num_words + 1, dtype=np.int64)
+                np.add.at(coverage, starts, 1)
+                np.add.at(coverage, starts + n, -1)
+                covered = np.cumsum(coverage[:num_words]) > 0
+                duplicate_fractions.append(int(lengths[covered].sum()) / total_chars)
+    return top_fractions, duplicate_fractions
+
+
+def compute_gopher_stats(text: str) -> GopherStats:
+    """All Gopher statistics for a document from one tokenization and one pass over its words."""
+    words = FAST_WORD_PATTERN.findall(text)
     lines = text.splitlines()
-    if len(lines) > 0:
-        ellipsis_lines = sum(1 for line in lines if line.strip().endswith("..."))
-        if (ellipsis_lines / len(lines)) > 0.3:
-            return False
+    paragraphs = [paragraph for paragraph in re.split(r'\n{2,}', text.strip()) if paragraph]
 
-    alphabetic_words = sum(1 for word in words if any(c.isalpha() for c in word))
-    if (alphabetic_words / num_words) < 0.8:
-        return False
+    num_words = len(words)
+    num_chars = alphabetic_words = num_stop_words = 0
+    for word in words:
+        num_chars += len(word)
+        if word.isalpha() or any(c.isalpha() for c in word):
+            alphabetic_words += 1
+        if word.lower() in STOP_WORDS:
+            num_stop_words += 1
 
-    return True
+    num_lines = max(len(lines), 1)
+    stripped_lines = [line.strip() for line in lines]
+    bullet_lines = sum(1 for line in stripped_lines if line.startswith(BULLETS))
+    ellipsis_lines = sum(1 for line in stripped_lines if line.endswith(('...', '…')))
+    num_symbols = text.count('#') + text.count('...') + text.count('…')
+
+    duplicate_line_fraction, duplicate_line_char_fraction = _duplicate_fractions(
+        [line for line in stripped_lines if line]
+    )
+    duplicate_paragraph_fraction, duplicate_paragraph_char_fraction = _duplicate_fractions(paragraphs)
+    top_fractions, duplicate_fractions = _ngram_char_fractions(words)
+
+    return GopherStats(
+        num_words,
+        num_chars / max(num_words, 1),
+        num_symbols / max(num_words, 1),
+        bullet_lines / num_lines,
+        ellipsis_lines / num_lines,
+        alphabetic_words / max(num_words, 1),
+        num_stop_words,
+        duplicate_line_fraction,
+        duplicate_line_char_fraction,
+        duplicate_paragraph_fraction,
+        duplicate_paragraph_char_fraction,
+        *top_fractions,
+        *duplicate_fractions,
+    )
+
+
+def passes_gopher_rules(stats: GopherStats, thresholds: GopherThresholds | None = None) -> bool:
+    """Apply the full Gopher rule set to precomputed stats."""
+    t = thresholds or GopherThresholds()
+    top_ngrams = (stats.top_2gram_char_fraction, stats.top_3gram_char_fraction, stats.top_4gram_char_fraction)
+    duplicate_ngrams = stats[-len(DUPLICATE_NGRAM_SIZES):]
+    return (
+        t.min_words <= stats.num_words <= t.max_words
+        and t.min_mean_word_length <= stats.mean_word_length <= t.max_mean_word_length
+        and stats.symbol_to_word_ratio <= t.max_symbol_to_word_ratio
+        and stats.bullet_line_fraction <= t.max_bullet_line_fraction
+        and stats.ellipsis_line_fraction <= t.max_ellipsis_line_fraction
+        and stats.alphabetic_word_fraction >= t.min_alphabetic_word_fraction
+        and stats.num_stop_words >= t.min_stop_words
+        and stats.duplicate_line_fraction <= t.max_duplicate_line_fraction
+        and stats.duplicate_line_char_fraction <= t.max_duplicate_line_char_fraction
+        and stats.duplicate_paragraph_fraction <= t.max_duplicate_paragraph_fraction
+        and stats.duplicate_paragraph_char_fraction <= t.max_duplicate_paragraph_char_fraction
+        and all(value <= limit for value, limit in zip(top_ngrams, t.max_top_ngram_char_fraction))
+        and all(value <= limit for value, limit in zip(duplicate_ngrams, t.max_duplicate_ngram_char_fraction))
+    )
+
+
+def run_gopher_full_filter(text: str, thresholds: GopherThresholds | None = None) -> bool:
+    return passes_gopher_rules(compute_gopher_stats(text), thresholds)
 
 if __name__ == "__main__":
 
     warc_path = "CC-MAIN-20241201162023-20241201192023-00000.warc"
-    texts = []
-    texts = extract_texts_from_warc(warc_path)
-    for i in range(10):
+    for i, (_, _, text) in enumerate(islice(iter_texts_from_warc(warc_path), 10)):
         print(f"{'='*60}")
         print(f"Document {i+1}")
-        text = texts[i]
         if len(text) < 500:
             continue
         else:
@@ -1,36 +1,86 @@
-import fasttext
+import os
 import random
-from cs336_data.extract_data import extract_texts_from_warc
+from collections.abc import Iterable
+from itertools import islice
+import numpy as np
+from cs336_data.extract_data import iter_texts_from_warc
+from cs336_data.model_registry import (
+    benchmark_quantized,
+    fixture_texts,
+    format_quantized_report,
+    get_model,
+    predict_batch,
+    quantize_model,
+    quantized_path,
+)
 
 model_path_nsfw = "jigsaw_fasttext_bigrams_nsfw_final.bin"
-model_nsfw = fasttext.load_model(model_path_nsfw)
 
-def classify_nsfw(string: str) -> tuple[str, float]:
+def classify_nsfw(string: str, quantized: bool = False) -> tuple[str, float]:
+    model_nsfw = get_model(model_path_nsfw, quantized=quantized)
     string = string.replace('\n', ' ')
     labels, scores = model_nsfw.predict(string, k=1)
     label = labels[0].replace('__label__', '')
     score = scores[0]
     return (label, score)
 
+def classify_nsfw_batch(
+    strings: Iterable[str], batch_size: int = 1024, quantized: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """Batched classify_nsfw: arrays of labels and scores."""
+    return predict_batch(
+        get_model(model_path_nsfw, quantized=quantized), strings, lambda string: string.replace('\n', ' '), batch_size
+    )
+
 model_path_hatespeech = "jigsaw_fasttext_bigrams_hatespeech_final.bin"
-model_hatespeech = fasttext.load_model(model_path_hatespeech)
 
-def classify_hatespeech(string: str) -> tuple[str, float]:
+def classify_hatespeech(string: str, quantized: bool = False) -> tuple[str, float]:
+    model_hatespeech = get_model(model_path_hatespeech, quantized=quantized)
     string = string.replace('\n', ' ')
     labels, scores = model_hatespeech.predict(string, k=1)
     label = labels[0].replace('__label__', '')
     score = scores[0]
     return (label, score)
 
+def classify_hatespeech_batch(
+    strings: Iterable[str], batch_size: int = 1024, quantized: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """Batched classify_hatespeech: arrays of labels and scores."""
+    return predict_batch(
+        get_model(model_path_hatespeech, quantized=quantized),
+        strings,
+        lambda string: string.replace('\n', ' '),
+        batch_size,
+    )
+
+def quantize_harmful_models(cutoff: int = 100_000, dsub: int = 2, qnorm: bool = False) -> list[str]:
+    """Write .ftz variants of the Jigsaw models next to them (no retraining, the training data is not shipped)."""
+    return [
+        quantize_model(path, cutoff=cutoff, dsub=dsub, qnorm=qnorm)
+        for path in (model_path_nsfw, model_path_hatespeech)
+    ]
+
 if __name__ == "__main__":
 
+    fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'tests', 'fixtures')
+
     warc_path = "CC-MAIN-20241201162023-20241201192023-00000.warc"
-    texts = []
-    texts = extract_texts_from_warc(warc_path)
-    for i in range(10):
+
+    if not all(os.path.exists(quantized_path(path)) for path in (model_path_nsfw, model_path_hatespeech)):
+        quantize_harmful_models()
+    heldout = [text for _, _, text in islice(iter_texts_from_warc(warc_path), 2000)]
+    for path in (model_path_nsfw, model_path_hatespeech):
+        report = benchmark_quantized(
+            path,
+            {'fixtures': (fixture_texts(fixtures_dir), None), 'heldout': (heldout, None)},
+            [quantized_path(path)],
+            normalize=lambda string: string.replace('\n', ' '),
+        )
+        print(format_quantized_report(report))
+
+    for i, (_, _, text) in enumerate(islice(iter_texts_from_warc(warc_path), 10)):
         print(f"{'='*60}")
         print(f"Document {i+1}")
-        text = texts[i]
         if len(text) < 500:
             continue
         else:
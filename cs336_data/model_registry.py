@@ -0,0 +1,347 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import fasttext
+import numpy as np
+
+from cs336_data.parallel import iter_chunks
+
+
+@dataclass
+class ModelInfo:
+    path: str
+    load_seconds: float
+    rss_delta_bytes: int
+    file_bytes: int
+
+
+_models: dict[str, fasttext.FastText._FastText] = {}
+_info: dict[str, ModelInfo] = {}
+_locks: dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (0 if it cannot be determined)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def quantized_path(path: str) -> str:
+    """Path of the quantized .ftz variant that sits next to a .bin model."""
+    return os.path.splitext(path)[0] + '.ftz'
+
+
+def resolve_model_path(path: str, quantized: bool = False) -> str:
+    """Absolute path of the model to load, preferring the .ftz variant if quantized and it exists."""
+    if quantized and os.path.exists(quantized_path(path)):
+        path = quantized_path(path)
+    return os.path.abspath(path)
+
+
+def get_model(path: str, quantized: bool = False) -> fasttext.FastText._FastText:
+    """Load a fastText model once per process and return the shared instance.
+
+    Models are keyed by absolute path and loaded on first use, so importing a
+    classifier module is free and every caller shares one copy of the weights.
+    Concurrent first calls for the same path block until a single load finishes.
+    """
+    key = resolve_model_path(path, quantized)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model = fasttext.load_model(key)
+            _info[key] = ModelInfo(
+                path=key,
+                load_seconds=time.perf_counter() - start,
+                rss_delta_bytes=_rss_bytes() - rss_before,
+                file_bytes=os.path.getsize(key),
+            )
+            _models[key] = model
+    return model
+
+
+def model_info() -> dict[str, ModelInfo]:
+    """Load time and memory of every model loaded so far, keyed by absolute path."""
+    return dict(_info)
+
+
+def unload_models() -> None:
+    """Drop every cached model (mainly for tests and long-lived workers switching models)."""
+    with _registry_lock:
+        _models.clear()
+        _info.clear()
+        _locks.clear()
+
+
+def preload_models(paths: Iterable[str], quantized: bool = False) -> None:
+    for path in paths:
+        get_model(path, quantized=quantized)
+
+
+def is_loaded(path: str, quantized: bool = False) -> bool:
+    return resolve_model_path(path, quantized) in _models
+
+
+def shared_model_pool(
+    max_workers: int | None = None,
+    preload: Iterable[str] = (),
+    quantized: bool = False,
+) -> ProcessPoolExecutor:
+    """ProcessPoolExecutor whose workers share one copy of the preloaded fastText models.
+
+    The models are loaded in the parent and the workers are forked, so the
+    registry is already populated in every child and the weights are shared
+    copy-on-write (fastText never writes to them during inference). Where fork
+    is unavailable, each worker loads the models once in its initializer instead.
+    """
+    preload = list(preload)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        preload_models(preload, quantized)
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=preload_models, initargs=(preload, quantized))
+
+
+def _memory_stats() -> dict[str, int]:
+    """Rss, Pss and private bytes of this process from /proc/self/smaps_rollup (Linux only)."""
+    stats = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                stats[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': stats.get('Rss', 0),
+        'pss': stats.get('Pss', 0),
+        'private': stats.get('Private_Clean', 0) + stats.get('Private_Dirty', 0),
+    }
+
+
+def _collect_results(results, workers: list, timeout: float) -> list:
+    """One item per worker from the results queue; raises RuntimeError if a worker dies or timeout passes first."""
+    items = []
+    deadline = time.monotonic() + timeout
+    while len(items) < len(workers):
+        try:
+            items.append(results.get(timeout=min(1.0, max(deadline - time.monotonic(), 0.01))))
+        except queue.Empty:
+            dead = [worker.exitcode for worker in workers if worker.exitcode not in (None, 0)]
+            if dead or time.monotonic() >= deadline:
+                for worker in workers:
+                    worker.terminate()
+                reason = f"worker exited with code {dead[0]}" if dead else f"no result after {timeout:.0f}s"
+                raise RuntimeError(f"benchmark worker failed: {reason}") from None
+    for worker in workers:
+        worker.join()
+    return items
+
+
+def _report_worker_memory(paths: list[str], quantized: bool, results) -> None:
+    start = time.perf_counter()
+    models = [get_model(path, quantized=quantized) for path in paths]
+    # Touch every model once so lazily-faulted pages are counted
+    for model in models:
+        model.predict('warm up', k=1)
+    results.put({'startup_seconds': time.perf_counter() - start, **_memory_stats()})
+
+
+def benchmark_shared_models(
+    paths: list[str], num_workers: int = 4, quantized: bool = False, timeout: float = 600.0
+) -> dict[str, dict]:
+    """Per-worker startup time and memory with and without preloading the models before fork.
+
+    Raises RuntimeError if a worker dies or does not report within timeout seconds.
+    """
+    ctx = multiprocessing.get_context('fork')
+    report = {}
+    for mode in ('per_worker_load', 'preloaded_fork'):
+        unload_models()
+        if mode == 'preloaded_fork':
+            preload_models(paths, quantized)
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_report_worker_memory, args=(paths, quantized, results)) for _ in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        stats = _collect_results(results, workers, timeout)
+        report[mode] = {key: sum(stat[key] for stat in stats) / num_workers for key in stats[0]}
+    unload_models()
+    return report
+
+
+def predict_batch(
+    model: fasttext.FastText._FastText,
+    texts: Iterable[str],
+    normalize: Callable[[str], str],
+    batch_size: int = 1024,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top-1 fastText predictions for many documents.
+
+    Each document is normalized once (fastText rejects newlines) and passed to
+    the list form of model.predict in chunks of batch_size. Returns an array of
+    labels with the __label__ prefix stripped and a float32 array of scores.
+    """
+    labels, scores = [], []
+    for chunk in iter_chunks(texts, batch_size):
+        chunk_labels, chunk_scores = model.predict([normalize(text) for text in chunk], k=1)
+        labels.extend(label[0] for label in chunk_labels)
+        scores.extend(score[0] for score in chunk_scores)
+    labels = np.array(labels, dtype=str)
+    return np.char.replace(labels, '__label__', ''), np.array(scores, dtype=np.float32)
+
+
+def quantize_model(
+    path: str,
+    output_path: str | None = None,
+    cutoff: int = 100_000,
+    dsub: int = 2,
+    qnorm: bool = False,
+    train_file: str | None = None,
+    thread: int | None = None,
+) -> str:
+    """Write a product-quantized .ftz copy of a .bin model and return its path.
+
+    Every dsub dimensions of a vector share one 8-bit code (8/dsub bits per
+    dimension, so larger dsub means smaller and less accurate). cutoff > 0 keeps
+    only the cutoff most important words and n-gram buckets; if train_file is
+    given the pruned model is retrained on it before quantizing. The output
+    defaults to quantized_path(path), which get_model(path, quantized=True) picks up.
+    """
+    output_path = output_path or quantized_path(path)
+    # quantize modifies the model in place, so never use the shared registry copy
+    model = fasttext.load_model(path)
+    model.quantize(
+        input=train_file, retrain=train_file is not None, cutoff=cutoff, dsub=dsub, qnorm=qnorm,
+        thread=thread, verbose=0,
+    )
+    model.save_model(output_path)
+    return output_path
+
+
+def read_fasttext_examples(path: str) -> tuple[list[str], list[str]]:
+    """Texts and gold labels (prefix stripped) of a __label__-formatted fastText file."""
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            label, _, text = line.rstrip('\n').partition(' ')
+            texts.append(text)
+            labels.append(label.replace('__label__', ''))
+    return texts, labels
+
+
+def fixture_texts(fixtures_dir: str) -> list[str]:
+    """Every non-empty line of the .txt files under fixtures_dir (e.g. tests/fixtures), as a small fixed evaluation set."""
+    texts = []
+    for root, _, files in sorted(os.walk(fixtures_dir)):
+        for name in sorted(files):
+            if name.endswith('.txt'):
+                with open(os.path.join(root, name), encoding='utf-8') as f:
+                    texts.extend(line.strip() for line in f if line.strip())
+    return texts
+
+
+def _benchmark_variant(path: str, eval_sets: dict, normalize: Callable[[str], str], results) -> None:
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    model = fasttext.load_model(path)
+    stats = {'load_seconds': time.perf_counter() - start, 'rss_delta_bytes': _rss_bytes() - rss_before}
+    for name, (texts, _) in eval_sets.items():
+        start = time.perf_counter()
+        labels, scores = predict_batch(model, texts, normalize)
+        stats[name] = {
+            'seconds': time.perf_counter() - start,
+            'labels': labels.tolist(),
+            'scores': scores,
+        }
+    results.put(stats)
+
+
+def benchmark_quantized(
+    path: str,
+    eval_sets: dict[str, tuple[list[str], list[str] | None]],
+    quantized_paths: list[str],
+    normalize: Callable[[str], str] = lambda text: ' '.join(text.split()),
+    timeout: float = 600.0,
+) -> dict[str, dict]:
+    """Load time, memory, predictions/sec and agreement with the full model for quantized variants.
+
+    eval_sets maps a name to (texts, gold labels or None). Each model is loaded
+    in a freshly forked process so load time and RSS are not skewed by models
+    loaded earlier. Agreement is the fraction of top-1 labels matching the full
+    model; accuracy against the gold labels is reported where they are given.
+    Raises RuntimeError if a worker dies or does not report within timeout seconds.
+    """
+    ctx = multiprocessing.get_context('fork')
+    runs = {}
+    for variant in [path, *quantized_paths]:
+        results = ctx.Queue()
+        worker = ctx.Process(target=_benchmark_variant, args=(variant, eval_sets, normalize, results))
+        worker.start()
+        runs[variant] = _collect_results(results, [worker], timeout)[0]
+
+    report = {}
+    reference = runs[path]
+    for variant, stats in runs.items():
+        entry = {
+            'file_bytes': os.path.getsize(variant),
+            'load_seconds': stats['load_seconds'],
+            'rss_delta_bytes': stats['rss_delta_bytes'],
+        }
+        for name, (texts, gold) in eval_sets.items():
+            labels = np.array(stats[name]['labels'])
+            full_labels = np.array(reference[name]['labels'])
+            entry[name] = {
+                'predictions_per_second': len(texts) / max(stats[name]['seconds'], 1e-9),
+                'agreement': float(np.mean(labels == full_labels)) if len(texts) else 1.0,
+                'mean_abs_score_diff': float(np.mean(np.abs(stats[name]['scores'] - reference[name]['scores'])))
+                if len(texts) else 0.0,
+            }
+            if gold is not None:
+                entry[name]['accuracy'] = float(np.mean(labels == np.array(gold))) if len(texts) else 1.0
+        report[variant] = entry
+    return report
+
+
+def format_quantized_report(report: dict[str, dict]) -> str:
+    lines = []
+    for variant, entry in report.items():
+        lines.append(f"{os.path.basename(variant)}: {entry['file_bytes'] / 2**20:.1f} MiB on disk, "
+                     f"load {entry['load_seconds']:.2f}s, rss +{entry['rss_delta_bytes'] / 2**20:.0f} MiB")
+        for name, stats in entry.items():
+            if isinstance(stats, dict):
+                accuracy = f", accuracy {stats['accuracy']:.4f}" if 'accuracy' in stats else ''
+                lines.append(f"  {name:>10}: {stats['predictions_per_second']:.0f} preds/sec, "
+                             f"agreement {stats['agreement']:.4f}, "
+                             f"mean |score diff| {stats['mean_abs_score_diff']:.4f}{accuracy}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    model_paths = [
+        "lid.176.bin",
+        "jigsaw_fasttext_bigrams_nsfw_final.bin",
+        "jigsaw_fasttext_bigrams_hatespeech_final.bin",
+    ]
+    model_paths = [path for path in model_paths if os.path.exists(path)]
+
+    report = benchmark_shared_models(model_paths, num_workers=4)
+    for mode, stats in report.items():
+        print(f"{mode:>16}: startup {stats['startup_seconds']:.2f}s, "
+              f"rss {stats['rss'] / 2**20:.0f} MiB, pss {stats['pss'] / 2**20:.0f} MiB, "
+              f"private {stats['private'] / 2**20:.0f} MiB per worker")
@@ -0,0 +1,44 @@
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def ordered_chunk_map(
+    function: Callable[[list], list],
+    items: Iterable,
+    num_workers: int | None = None,
+    chunk_size: int = 256,
+    executor: Executor | None = None,
+) -> Iterator:
+    """Yield the results of function over chunks of items, flattened and in input order, from a process pool.
+
+    At most two chunks per worker are in flight, so items is consumed lazily.
+    num_workers=1 runs in the calling process. function must be picklable (a
+    module-level function, or a functools.partial of one). Pass an executor,
+    e.g. model_registry.shared_model_pool, to run in it instead of a new pool;
+    it is left open.
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    if num_workers == 1 and executor is None:
+        for chunk in iter_chunks(items, chunk_size):
+            yield from function(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=num_workers) if executor is None else nullcontext(executor) as pool:
+        in_flight = deque()
+        for chunk in iter_chunks(items, chunk_size):
+            in_flight.append(pool.submit(function, chunk))
+            if len(in_flight) >= 2 * num_workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
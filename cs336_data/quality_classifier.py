@@ -1,10 +1,32 @@
 import fasttext
 import random
 import gzip
-import subprocess
+import io
+import math
 import glob
 import os
-from cs336_data.extract_data import extract_texts_from_warc
+import shutil
+import tempfile
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from functools import partial
+from itertools import chain, islice
+import numpy as np
+from cs336_data import extract_data, warc_fetcher
+from cs336_data.extract_data import iter_texts_from_warc
+from cs336_data.model_registry import (
+    benchmark_quantized,
+    fixture_texts,
+    format_quantized_report,
+    get_model,
+    predict_batch,
+    quantize_model,
+    quantized_path,
+    read_fasttext_examples,
+)
+from cs336_data.parallel import ordered_chunk_map
+from cs336_data.step_cache import StepCache, load_texts, save_texts
+from cs336_data.warc_fetcher import fetch_urls_to_warc, format_fetch_report
 
 def classify_string(model: fasttext.FastText._FastText, text: str) -> tuple[str, float]:
     """Classify text using the provided fastText model."""
@@ -14,8 +36,43 @@ def classify_string(model: fasttext.FastText._FastText, text: str) -> tuple[str,
     score = float(scores[0])
     return label, score
 
-def sample_urls(urls_file: str, n: int = 1000, output_file: str = "sampled_urls.txt"):
-    """Sample n random URLs from the file."""
+def classify_strings(
+    model: fasttext.FastText._FastText, texts: Iterable[str], batch_size: int = 1024
+) -> tuple[np.ndarray, np.ndarray]:
+    """Batched classify_string: arrays of labels and scores."""
+    return predict_batch(model, texts, lambda text: ' '.join(text.split()), batch_size)
+
+def reservoir_sample(items: Iterable, k: int, rng: random.Random | None = None) -> list:
+    """Uniform sample of k items from a stream of unknown length, holding only k items (Algorithm L)."""
+    rng = rng or random
+    iterator = iter(items)
+    reservoir = list(islice(iterator, k))
+    if len(reservoir) < k or k == 0:
+        return reservoir
+
+    # Skip ahead by geometrically distributed gaps instead of drawing a random number per item
+    w = math.exp(math.log(1.0 - rng.random()) / k)
+    while True:
+        skip = math.floor(math.log(1.0 - rng.random()) / math.log(max(1.0 - w, 1e-300)))
+        item = next(islice(iterator, skip, skip + 1), None)
+        if item is None:
+            return reservoir
+        reservoir[rng.randrange(k)] = item
+        w *= math.exp(math.log(1.0 - rng.random()) / k)
+
+
+def iter_valid_urls(urls_file: str, buffer_size: int = 1 << 20) -> Iterator[str]:
+    """Stream plausible http(s) URLs from a gzipped one-URL-per-line file through a large read buffer."""
+    with gzip.open(urls_file, 'rb') as raw, \
+            io.TextIOWrapper(io.BufferedReader(raw, buffer_size=buffer_size), errors='ignore') as f:
+        for line in f:
+            url = line.strip()
+            if url.startswith('http') and ' ' not in url and len(url) < 500:
+                yield url
+
+
+def sample_urls(urls_file: str, n: int = 1000, output_file: str = "sampled_urls.txt", seed: int | None = None):
+    """Sample n random URLs from the file with streaming reservoir sampling (memory independent of file size)."""
     
     # Skip if already done
     if os.path.exists(output_file):
@@ -26,15 +83,18 @@ def sample_urls(urls_file: str, n: int = 1000, output_file: str = "sampled_urls.
     
     print(f"Reading URLs from {urls_file}...")
     
-    urls = []
-    with gzip.open(urls_file, 'rt', errors='ignore') as f:
-        for line in f:
-            url = line.strip()
-            if url.startswith('http') and ' ' not in url and len(url) < 500:
-                urls.append(url)
+    rng = random.Random(seed) if seed is not None else random
+    total = 0
+
+    def counted(urls):
+        nonlocal total
+        for url in urls:
+            total += 1
+            yield url
+
+    sampled = reservoir_sample(counted(iter_valid_urls(urls_file)), n, rng)
     
-    print(f"Total valid URLs: {len(urls):,}")
-    sampled = random.sample(urls, min(n, len(urls)))
+    print(f"Total valid URLs: {total:,}")
     
     with open(output_file, 'w') as f:
         for url in sampled:
@@ -44,8 +104,8 @@ def sample_urls(urls_file: str, n: int = 1000, output_file: str = "sampled_urls.
     return output_file
 
 
-def scrape_urls_parallel(urls_file: str, warc_prefix: str = "positive_samples", jobs: int = 10) -> str:
-    """Scrape URLs in parallel using background processes."""
+def scrape_urls_parallel(urls_file: str, warc_prefix: str = "positive_samples", jobs: int = 64) -> str:
+    """Fetch URLs with up to jobs concurrent requests, writing responses straight to WARC chunks."""
     
     # Check if WARC files already exist
     existing_warcs = glob.glob(f"{warc_prefix}_chunk_*.warc.gz")
@@ -53,55 +113,25 @@ def scrape_urls_parallel(urls_file: str, warc_prefix: str = "positive_samples",
         print(f"[CACHED] Found {len(existing_warcs)} existing WARC files")
         return f"{warc_prefix}_chunk_*.warc.gz"
     
-    print(f"Scraping URLs from {urls_file} with {jobs} parallel jobs...")
+    print(f"Scraping URLs from {urls_file} with {jobs} concurrent requests...")
     
     with open(urls_file, 'r') as f:
         urls = [line.strip() for line in f if line.strip()]
     
-    # Split into chunks
-    chunk_size = max(1, len(urls) // jobs)
-    chunks = [urls[i:i + chunk_size] for i in range(0, len(urls), chunk_size)]
-    
-    # Run wget in parallel
-    processes = []
-    for i, chunk in enumerate(chunks):
-        chunk_file = f"{warc_prefix}_chunk_{i}.txt"
-        with open(chunk_file, 'w') as f:
-            f.write('\n'.join(chunk))
-        
-        cmd = [
-            "wget",
-            "--timeout=3",
-            "--tries=1",
-            "-i", chunk_file,
-            f"--warc-file={warc_prefix}_chunk_{i}",
-            "-O", "/dev/null",
-            "--quiet",
-            "--no-check-certificate",
-        ]
-        processes.append(subprocess.Popen(cmd))
-    
-    # Wait for all
-    for i, p in enumerate(processes):
-        p.wait()
-        print(f"  Chunk {i+1}/{len(processes)} done")
-    
-    # Cleanup temp .txt files
-    for i in range(len(chunks)):
-        chunk_file = f"{warc_prefix}_chunk_{i}.txt"
-        if os.path.exists(chunk_file):
-            os.remove(chunk_file)
+    _, report = fetch_urls_to_warc(urls, warc_prefix, concurrency=jobs, timeout=3.0, max_retries=1)
+    print(format_fetch_report(report))
     
     return f"{warc_prefix}_chunk_*.warc.gz"
 
 
-def extract_from_warcs(warc_pattern: str, max_docs: int = 5000) -> list[str]:
-    """Extract texts from multiple WARC files matching pattern."""
+def extract_from_warcs(warc_pattern: str, max_docs: int = 5000, min_words: int = 100) -> list[str]:
+    """Extract texts with more than min_words words from multiple WARC files matching pattern."""
     
     all_texts = []
+    skipped = Counter()
     
     # Expand glob pattern
-    warc_files = glob.glob(warc_pattern)
+    warc_files = sorted(glob.glob(warc_pattern))
     
     if not warc_files:
         print(f"Warning: No files found matching {warc_pattern}")
@@ -112,9 +142,8 @@ def extract_from_warcs(warc_pattern: str, max_docs: int = 5000) -> list[str]:
     for warc_path in warc_files:
         print(f"  Extracting from {warc_path}...")
         try:
-            texts = extract_texts_from_warc(warc_path)
-            for text in texts:
-                if len(text.split()) > 100:
+            for _, _, text in iter_texts_from_warc(warc_path, skipped=skipped):
+                if len(text.split()) > min_words:
                     all_texts.append(text)
                 if len(all_texts) >= max_docs:
                     break
@@ -124,88 +153,212 @@ def extract_from_warcs(warc_pattern: str, max_docs: int = 5000) -> list[str]:
         if len(all_texts) >= max_docs:
             break
     
-    print(f"Extracted {len(all_texts)} documents total")
+    print(f"Extracted {len(all_texts)} documents total (skipped records: {dict(skipped)})")
     return all_texts
 
 
+def format_fasttext_example(label: str, text: str, max_words: int = 300, min_words: int = 30) -> str | None:
+    """fastText training line for text truncated to max_words, or None if it has min_words words or fewer."""
+    words = text.split()
+    if len(words) <= min_words:
+        return None
+    return f"__label__{label} {' '.join(words[:max_words])}"
+
+
+def _format_examples(chunk: list[tuple[str, str]], max_words: int, min_words: int) -> list[str]:
+    lines = []
+    for label, text in chunk:
+        line = format_fasttext_example(label, text, max_words, min_words)
+        if line is not None:
+            lines.append(line)
+    return lines
+
+
+def iter_fasttext_examples(
+    labeled_texts: Iterable[tuple[str, str]],
+    max_words: int = 300,
+    min_words: int = 30,
+    num_workers: int | None = None,
+    chunk_size: int = 512,
+) -> Iterator[str]:
+    """Yield training lines for (label, text) pairs in input order, formatted in a process pool.
+
+    num_workers=1 formats in the calling process.
+    """
+    format_chunk = partial(_format_examples, max_words=max_words, min_words=min_words)
+    yield from ordered_chunk_map(format_chunk, labeled_texts, num_workers, chunk_size)
+
+
+def _scatter(lines: Iterable[str], paths: list[str], rng) -> list[int]:
+    counts = [0] * len(paths)
+    files = [open(path, 'w', encoding='utf-8') for path in paths]
+    try:
+        for line in lines:
+            bucket = rng.randrange(len(files))
+            files[bucket].write(line + '\n')
+            counts[bucket] += 1
+    finally:
+        for f in files:
+            f.close()
+    return counts
+
+
+def _shuffle_bucket(path: str, count: int, buffer_lines: int, rng) -> Iterator[str]:
+    if count <= buffer_lines:
+        with open(path, encoding='utf-8') as f:
+            lines = [line.rstrip('\n') for line in f]
+        os.remove(path)
+        rng.shuffle(lines)
+        yield from lines
+        return
+
+    # Still too large for memory: scatter it again into smaller buckets
+    paths = [f"{path}.{i}" for i in range(2 * math.ceil(count / buffer_lines))]
+    with open(path, encoding='utf-8') as f:
+        counts = _scatter((line.rstrip('\n') for line in f), paths, rng)
+    os.remove(path)
+    for sub_path, sub_count in zip(paths, counts):
+        yield from _shuffle_bucket(sub_path, sub_count, buffer_lines, rng)
+
+
+def external_shuffle(
+    lines: Iterable[str],
+    buffer_lines: int = 100_000,
+    num_buckets: int = 64,
+    rng: random.Random | None = None,
+    tmp_dir: str | None = None,
+) -> Iterator[str]:
+    """Yield newline-free lines in uniformly random order, holding at most about buffer_lines in memory.
+
+    Inputs that fit in the buffer are shuffled in memory. Larger inputs are
+    scattered to random bucket files under tmp_dir, then each bucket is read back
+    and shuffled on its own (buckets that outgrew the buffer are scattered again).
+    """
+    rng = rng or random
+    iterator = iter(lines)
+    buffer = list(islice(iterator, buffer_lines + 1))
+    if len(buffer) <= buffer_lines:
+        rng.shuffle(buffer)
+        yield from buffer
+        return
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        paths = [os.path.join(tmp, f"bucket_{i}") for i in range(num_buckets)]
+        counts = _scatter(chain(buffer, iterator), paths, rng)
+        del buffer
+        for path, count in zip(paths, counts):
+            yield from _shuffle_bucket(path, count, buffer_lines, rng)
+
+
 def prepare_fasttext_data(
-    positive_texts: list[str], 
-    negative_texts: list[str], 
-    output_file: str = "quality_train.txt"
+    positive_texts: Iterable[str], 
+    negative_texts: Iterable[str], 
+    output_file: str = "quality_train.txt",
+    validation_file: str | None = None,
+    validation_fraction: float = 0.1,
+    max_words: int = 300,
+    min_words: int = 30,
+    num_workers: int | None = None,
+    shuffle_buffer: int = 100_000,
+    seed: int | None = None,
 ) -> str:
-    """Create fastText training file."""
+    """Create the fastText training file (and optionally a validation split) from document streams.
+
+    Documents are cleaned and truncated in a worker pool, shuffled through a
+    bounded external shuffle, and written line by line, so memory does not grow
+    with the number of examples. With validation_file set, each example goes to
+    the validation split with probability validation_fraction.
+    """
     
     # Skip if already done
-    if os.path.exists(output_file):
+    if os.path.exists(output_file) and (validation_file is None or os.path.exists(validation_file)):
         with open(output_file, 'r') as f:
             count = sum(1 for _ in f)
         print(f"[CACHED] {output_file} already exists ({count} examples)")
         return output_file
     
-    def clean(text):
-        text = ' '.join(text.split())
-        return ' '.join(text.split()[:300])
-    
-    lines = []
-    
-    for text in positive_texts:
-        clean_text = clean(text)
-        if len(clean_text.split()) > 30:
-            lines.append(f"__label__high_quality {clean_text}")
-    
-    for text in negative_texts:
-        clean_text = clean(text)
-        if len(clean_text.split()) > 30:
-            lines.append(f"__label__low_quality {clean_text}")
-    
-    random.shuffle(lines)
-    
-    with open(output_file, 'w') as f:
-        f.write('\n'.join(lines))
-    
-    print(f"Created {output_file} with {len(lines)} examples")
+    rng = random.Random(seed) if seed is not None else random
+    labeled = chain(
+        (('high_quality', text) for text in positive_texts),
+        (('low_quality', text) for text in negative_texts),
+    )
+    examples = iter_fasttext_examples(labeled, max_words, min_words, num_workers)
+    tmp_dir = os.path.dirname(os.path.abspath(output_file))
+    
+    counts = Counter()
+    with open(output_file + '.tmp', 'w', encoding='utf-8') as train, \
+            open(validation_file + '.tmp' if validation_file else os.devnull, 'w', encoding='utf-8') as valid:
+        for line in external_shuffle(examples, shuffle_buffer, rng=rng, tmp_dir=tmp_dir):
+            split = 'validation' if validation_file and rng.random() < validation_fraction else 'train'
+            (valid if split == 'validation' else train).write(line + '\n')
+            counts[split] += 1
+            counts[line[:line.index(' ')].replace('__label__', '')] += 1
+    
+    os.replace(output_file + '.tmp', output_file)
+    if validation_file:
+        os.replace(validation_file + '.tmp', validation_file)
+    
+    print(f"Created {output_file} with {counts['train']} examples "
+          f"({counts['high_quality']} high_quality, {counts['low_quality']} low_quality overall)")
+    if validation_file:
+        print(f"Created {validation_file} with {counts['validation']} examples")
     return output_file
 
 
-def train_classifier(train_file: str, model_path: str = "quality_classifier.bin"):
-    """Train fastText classifier."""
+TRAIN_HYPERPARAMS = {'epoch': 25, 'lr': 0.1, 'wordNgrams': 2, 'dim': 100, 'loss': 'softmax'}
+
+
+def train_classifier(
+    train_file: str, model_path: str = "quality_classifier.bin", quantize: dict | None = None, **hyperparams
+):
+    """Train fastText classifier (hyperparams override TRAIN_HYPERPARAMS).
+
+    With quantize (quantize_model options such as cutoff, dsub and qnorm, plus
+    retrain=True to retrain the pruned model on train_file) a .ftz variant is
+    also written next to model_path.
+    """
+    hyperparams = {**TRAIN_HYPERPARAMS, **hyperparams}
+    
+    def write_quantized():
+        options = dict(quantize)
+        retrain = options.pop('retrain', False)
+        ftz_path = quantize_model(
+            model_path, train_file=train_file if retrain else None, thread=hyperparams.get('thread'), **options
+        )
+        print(f"Quantized model saved to {ftz_path} ({os.path.getsize(ftz_path) / 2**20:.1f} MiB, "
+              f"full model {os.path.getsize(model_path) / 2**20:.1f} MiB)")
     
     # Skip if already done
     if os.path.exists(model_path):
         print(f"[CACHED] {model_path} already exists")
-        return fasttext.load_model(model_path)
+        if quantize is not None and not os.path.exists(quantized_path(model_path)):
+            write_quantized()
+        return get_model(model_path)
     
     print("Training fastText classifier...")
     
-    model = fasttext.train_supervised(
-        input=train_file,
-        epoch=25,
-        lr=0.1,
-        wordNgrams=2,
-        dim=100,
-        loss='softmax',
-    )
+    model = fasttext.train_supervised(input=train_file, **hyperparams)
     
     model.save_model(model_path)
     
     n, p, r = model.test(train_file)
     print(f"Training - Samples: {n}, Precision: {p:.4f}, Recall: {r:.4f}")
     
+    if quantize is not None:
+        write_quantized()
+    
     return model
 
 
 MODEL_PATH = "quality_classifier.bin"
-_model = None
 
 
-def run_classify_quality(text: str) -> tuple[bool, float]:
+def run_classify_quality(text: str, quantized: bool = False) -> tuple[bool, float]:
     """Classify text quality. Returns: (is_high_quality, confidence)"""
-    global _model
-    if _model is None:
-        _model = fasttext.load_model(MODEL_PATH)
+    model = get_model(MODEL_PATH, quantized=quantized)
 
     text = ' '.join(text.split())
-    labels, scores = _model.predict(text, k=1)
+    labels, scores = model.predict(text, k=1)
     
     label = labels[0].replace('__label__', '')
     score = float(scores[0])
@@ -213,37 +366,133 @@ def run_classify_quality(text: str) -> tuple[bool, float]:
     return (label == "high_quality", score)
 
 
+def run_classify_quality_batch(
+    texts: Iterable[str], batch_size: int = 1024, quantized: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """Batched run_classify_quality: boolean is_high_quality array and confidence array."""
+    labels, scores = classify_strings(get_model(MODEL_PATH, quantized=quantized), texts, batch_size)
+    return labels == "high_quality", scores
+
+
 if __name__ == "__main__":
+
+    fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'tests', 'fixtures')
+
     random.seed(42)
     
     CC_WARC = "CC-MAIN-20241201162023-20241201192023-00000.warc"
     WIKI_URLS = "enwiki-20240420-extracted_urls.txt.gz"
     SAMPLED_URLS = 1000
-    PARALLEL_JOBS = 10
+    PARALLEL_JOBS = 64
+    MAX_POSITIVES = 5000
+    MIN_DOC_WORDS = 100
+    SEED = 42
+    DATA_PARAMS = {'max_words': 300, 'min_words': 30, 'validation_fraction': 0.1}
+    QUANTIZE_PARAMS = {'cutoff': 100_000, 'dsub': 2, 'qnorm': False, 'retrain': True}
+    
+    # Every step is cached under a hash of its parameters and inputs, so changing
+    # e.g. TRAIN_HYPERPARAMS only re-runs training and reuses the scraped pages
+    cache = StepCache("quality_pipeline_cache")
     
     print("STEP 1: Sample Wikipedia URLs")
-    sampled_urls = sample_urls(WIKI_URLS, n=SAMPLED_URLS, output_file="sampled_wiki_urls.txt")
+    urls_step = cache.run(
+        'sample_urls',
+        lambda out: sample_urls(WIKI_URLS, n=SAMPLED_URLS, output_file=os.path.join(out, "sampled_urls.txt"), seed=SEED),
+        params={'n': SAMPLED_URLS, 'seed': SEED},
+        files=[WIKI_URLS],
+        code=[sample_urls, reservoir_sample, iter_valid_urls],
+    )
     
+    # Steps that call into other modules fingerprint those whole modules, so a change to
+    # the fetcher or the HTML extraction invalidates the artifacts built with them
     print("STEP 2: Scrape URLs in parallel")
-    warc_pattern = scrape_urls_parallel(sampled_urls, "positive_samples", jobs=PARALLEL_JOBS)
+    scrape_step = cache.run(
+        'scrape',
+        lambda out: scrape_urls_parallel(
+            urls_step.path("sampled_urls.txt"), os.path.join(out, "positive_samples"), jobs=PARALLEL_JOBS
+        ),
+        params={'jobs': PARALLEL_JOBS},
+        inputs=[urls_step],
+        code=[scrape_urls_parallel, warc_fetcher],
+    )
     
     print("STEP 3: Extract positive examples from Wikipedia URLs")
-    positive_texts = extract_from_warcs(warc_pattern)
+    positives_step = cache.run(
+        'extract_positives',
+        lambda out: save_texts(
+            os.path.join(out, "texts.jsonl"),
+            extract_from_warcs(
+                scrape_step.path("positive_samples_chunk_*.warc.gz"), max_docs=MAX_POSITIVES, min_words=MIN_DOC_WORDS
+            ),
+        ),
+        params={'max_docs': MAX_POSITIVES, 'min_words': MIN_DOC_WORDS},
+        inputs=[scrape_step],
+        code=[extract_from_warcs, extract_data],
+    )
+    with open(positives_step.path("texts.jsonl")) as f:
+        n_positive = sum(1 for _ in f)
     
     print("STEP 4: Extract negative examples from Common Crawl")
-    negative_texts = extract_texts_from_warc(CC_WARC)
-    negative_texts = [t for t in negative_texts if len(t.split()) > 100]
+    # Capped at the number of positives to keep the classes balanced
+    negatives_step = cache.run(
+        'extract_negatives',
+        lambda out: save_texts(
+            os.path.join(out, "texts.jsonl"),
+            extract_from_warcs(CC_WARC, max_docs=n_positive, min_words=MIN_DOC_WORDS),
+        ),
+        params={'max_docs': n_positive, 'min_words': MIN_DOC_WORDS},
+        files=[CC_WARC],
+        code=[extract_from_warcs, extract_data],
+    )
     
-    n_samples = min(len(positive_texts), len(negative_texts))
-    positive_texts = positive_texts[:n_samples]
-    negative_texts = negative_texts[:n_samples]
+    with open(negatives_step.path("texts.jsonl")) as f:
+        n_negative = sum(1 for _ in f)
+    # The Common Crawl shard may hold fewer negatives than there are positives
+    n_samples = min(n_positive, n_negative)
     print(f"Balanced: {n_samples} positive, {n_samples} negative")
     
     print("STEP 5: Prepare training data")
-    train_file = prepare_fasttext_data(positive_texts, negative_texts)
+    data_step = cache.run(
+        'prepare_data',
+        lambda out: prepare_fasttext_data(
+            islice(load_texts(positives_step.path("texts.jsonl")), n_samples),
+            islice(load_texts(negatives_step.path("texts.jsonl")), n_samples),
+            os.path.join(out, "train.txt"),
+            validation_file=os.path.join(out, "valid.txt"),
+            seed=SEED,
+            **DATA_PARAMS,
+        ),
+        params={'seed': SEED, 'n_samples': n_samples, **DATA_PARAMS},
+        inputs=[positives_step, negatives_step],
+        code=[
+            prepare_fasttext_data, format_fasttext_example, _format_examples, iter_fasttext_examples,
+            external_shuffle, _scatter, _shuffle_bucket,
+        ],
+    )
     
     print("STEP 6: Train classifier")
-    model = train_classifier(train_file)
+    model_step = cache.run(
+        'train',
+        lambda out: train_classifier(
+            data_step.path("train.txt"), os.path.join(out, "model.bin"), quantize=QUANTIZE_PARAMS, **TRAIN_HYPERPARAMS
+        ),
+        params={**TRAIN_HYPERPARAMS, 'quantize': QUANTIZE_PARAMS},
+        inputs=[data_step],
+        code=[train_classifier, quantize_model],
+    )
+    model = get_model(model_step.path("model.bin"))
+    n_valid, precision, recall = model.test(data_step.path("valid.txt"))
+    print(f"Validation: {n_valid} examples, precision@1 {precision:.4f}, recall@1 {recall:.4f}")
+    shutil.copyfile(model_step.path("model.bin"), MODEL_PATH)
+    shutil.copyfile(model_step.path("model.ftz"), quantized_path(MODEL_PATH))
+    
+    print("Full vs quantized model:")
+    report = benchmark_quantized(
+        model_step.path("model.bin"),
+        {'fixtures': (fixture_texts(fixtures_dir), None), 'heldout': read_fasttext_examples(data_step.path("valid.txt"))},
+        [model_step.path("model.ftz")],
+    )
+    print(format_quantized_report(report))
     
     print("STEP 7: Test classifier")
     test_cases = [
@@ -261,9 +510,4 @@ if __name__ == "__main__":
         predicted = "HIGH" if is_high else "LOW"
         print(f"Expected: {expected}, Got: {predicted} ({score:.4f})")
     
-    print("Model saved to: quality_classifier.bin")
-
-    temp_files = glob.glob("positive_samples_chunk_*.warc.gz") + glob.glob("positive_samples_chunk_*.txt")
-    for temp_file in temp_files:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
\ No newline at end of file
+    print(f"Model saved to: {MODEL_PATH} (artifacts in {model_step.dir})")
\ No newline at end of file
@@ -0,0 +1,145 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from types import ModuleType
+
+FULL_HASH_LIMIT = 64 * 1024 * 1024
+SAMPLE_BYTES = 1024 * 1024
+
+
+@dataclass
+class Step:
+    name: str
+    key: str
+    dir: str
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.dir, *parts)
+
+
+def file_fingerprint(path: str) -> str:
+    """Content hash of an input file.
+
+    Files up to FULL_HASH_LIMIT are hashed in full. Larger raw inputs (WARCs,
+    URL dumps) are fingerprinted by size, mtime and their first and last
+    SAMPLE_BYTES, so fingerprinting stays cheap.
+    """
+    h = hashlib.sha256()
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        if stat.st_size <= FULL_HASH_LIMIT:
+            while block := f.read(SAMPLE_BYTES):
+                h.update(block)
+        else:
+            h.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            h.update(f.read(SAMPLE_BYTES))
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def code_fingerprint(code: Callable | ModuleType) -> str:
+    """Hash of the source of a function, or of a whole module."""
+    return hashlib.sha256(inspect.getsource(code).encode()).hexdigest()
+
+
+class StepCache:
+    """Content-addressed artifacts for multi-step pipelines.
+
+    A step's key is a hash of its name, parameters, the keys of the steps it
+    consumes, fingerprints of its input files and the source of the functions
+    (or whole modules) that implement it. Artifacts are written under <root>/<name>-<key>/, so a
+    step only re-runs when something it depends on changed, and changing a
+    late step's parameters leaves every earlier artifact in place.
+    """
+
+    def __init__(self, root: str = '.step_cache'):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def key(
+        self,
+        name: str,
+        params: dict | None = None,
+        inputs: Iterable[Step] = (),
+        files: Iterable[str] = (),
+        code: Iterable[Callable | ModuleType] = (),
+    ) -> str:
+        description = {
+            'name': name,
+            'params': params or {},
+            'inputs': [step.key for step in inputs],
+            'files': [file_fingerprint(path) for path in files],
+            'code': [code_fingerprint(function) for function in code],
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def run(
+        self,
+        name: str,
+        build: Callable[[str], object],
+        params: dict | None = None,
+        inputs: Iterable[Step] = (),
+        files: Iterable[str] = (),
+        code: Iterable[Callable | ModuleType] = (),
+    ) -> Step:
+        """Return the cached step, or call build(directory) to create its artifacts first.
+
+        build writes into a temporary directory that is renamed into place only
+        after it returns, so an interrupted step is never treated as cached.
+        """
+        inputs, files = list(inputs), list(files)
+        key = self.key(name, params, inputs, files, code)
+        step = Step(name, key, os.path.join(self.root, f"{name}-{key}"))
+        if os.path.isdir(step.dir):
+            print(f"[CACHED] {name} ({key})")
+            return step
+
+        tmp_dir = step.dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        start = time.perf_counter()
+        build(tmp_dir)
+        with open(os.path.join(tmp_dir, 'step.json'), 'w') as f:
+            json.dump({
+                'name': name,
+                'key': key,
+                'params': params or {},
+                'inputs': {step.name: step.key for step in inputs},
+                'files': files,
+                'seconds': time.perf_counter() - start,
+            }, f, indent=2, default=str)
+        os.replace(tmp_dir, step.dir)
+        print(f"{name} finished in {time.perf_counter() - start:.1f}s ({key})")
+        return step
+
+    def steps(self) -> list[dict]:
+        """Metadata of every completed step in the cache."""
+        entries = []
+        for entry in sorted(os.listdir(self.root)):
+            meta_path = os.path.join(self.root, entry, 'step.json')
+            if not entry.endswith('.tmp') and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    entries.append(json.load(f))
+        return entries
+
+
+def save_texts(path: str, texts: Iterable[str]) -> int:
+    """Write documents to a JSON-lines artifact; returns the number written."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for text in texts:
+            f.write(json.dumps(text) + '\n')
+            count += 1
+    return count
+
+
+def load_texts(path: str) -> Iterator[str]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
@@ -0,0 +1,463 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import io
+import os
+import random
+import ssl
+import time
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from urllib.parse import quote, urljoin, urlsplit
+
+import numpy as np
+from fastwarc.warc import WarcRecord, WarcRecordType
+
+USER_AGENT = 'cs336-data-fetcher/1.0'
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RESPONSE_BYTES = 10 * 1024 * 1024
+MAX_BACKOFF_SECONDS = 30.0
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    status: int
+    reason: str
+    headers: list[tuple[str, str]]
+    body: bytes
+
+    def header(self, name: str) -> str | None:
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def to_http_bytes(self) -> bytes:
+        """Status line, headers and body as stored in a WARC response record.
+
+        The body has already been de-chunked, so Transfer-Encoding is dropped and
+        Content-Length is rewritten to match what is actually stored.
+        """
+        lines = [f"HTTP/1.1 {self.status} {self.reason}"]
+        lines.extend(
+            f"{key}: {value}" for key, value in self.headers
+            if key.lower() not in ('transfer-encoding', 'content-length')
+        )
+        lines.append(f"Content-Length: {len(self.body)}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1') + self.body
+
+
+@dataclass
+class FetchResult:
+    url: str
+    final_url: str
+    status: int | None
+    seconds: float
+    num_bytes: int
+    attempts: int
+    error: str | None = None
+    written: bool = False
+
+
+def _insecure_ssl_context() -> ssl.SSLContext:
+    # Same trade-off as wget --no-check-certificate: we only want the page content
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections with at most max_per_host open to each (scheme, host, port).
+
+    Connections are handed out by acquire and returned by release; a connection
+    is only kept for reuse if its last response was fully read and the server
+    did not ask to close it.
+    """
+
+    def __init__(self, max_per_host: int = 4, connect_timeout: float = 10.0, ssl_context: ssl.SSLContext | None = None):
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl_context or _insecure_ssl_context()
+        self.opened = 0
+        self.reused = 0
+        self._idle = defaultdict(deque)
+        self._slots = {}
+
+    def _slot(self, key) -> asyncio.Semaphore:
+        return self._slots.setdefault(key, asyncio.Semaphore(self.max_per_host))
+
+    async def acquire(self, key: tuple[str, str, int], fresh: bool = False):
+        """Returns (reader, writer, reused) once a slot for the host is free."""
+        await self._slot(key).acquire()
+        idle = self._idle[key]
+        while idle and not fresh:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                self.reused += 1
+                return reader, writer, True
+            writer.close()
+
+        scheme, host, port = key
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self.ssl_context if scheme == 'https' else None),
+                self.connect_timeout,
+            )
+        except BaseException:
+            self._slot(key).release()
+            raise
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, key: tuple[str, str, int], reader, writer, reusable: bool) -> None:
+        if reusable:
+            self._idle[key].append((reader, writer))
+        else:
+            writer.close()
+        self._slot(key).release()
+
+    async def close(self) -> None:
+        writers = [writer for idle in self._idle.values() for _, writer in idle]
+        self._idle.clear()
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class HostRateLimiter:
+    """Space out request starts so no host sees more than requests_per_second (None disables the limit)."""
+
+    def __init__(self, requests_per_second: float | None = None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_start = {}
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_start.get(host, now))
+        self._next_start[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def _read_chunked(reader: asyncio.StreamReader, max_bytes: int) -> bytes:
+    chunks, size = [], 0
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        length = int(line.split(b';', 1)[0].strip(), 16)
+        if length == 0:
+            break
+        size += length
+        if size > max_bytes:
+            raise ValueError('response too large')
+        chunks.append(await reader.readexactly(length))
+        await reader.readexactly(2)
+    # Skip trailers
+    while await reader.readuntil(b'\r\n') != b'\r\n':
+        pass
+    return b''.join(chunks)
+
+
+async def _read_response(reader: asyncio.StreamReader, max_bytes: int):
+    """Parse one HTTP/1.x response; returns (status, reason, headers, body, keep_alive)."""
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('iso-8859-1')
+    status_line, *header_lines = head.split('\r\n')
+    version, status, reason = (status_line.split(' ', 2) + [''])[:3]
+    status = int(status)
+    headers = [
+        (name.strip(), value.strip())
+        for name, _, value in (line.partition(':') for line in header_lines if line)
+    ]
+    lookup = {name.lower(): value for name, value in headers}
+    keep_alive = version == 'HTTP/1.1' and lookup.get('connection', '').lower() != 'close'
+
+    if status < 200 or status in (204, 304):
+        body = b''
+    elif 'chunked' in lookup.get('transfer-encoding', '').lower():
+        body = await _read_chunked(reader, max_bytes)
+    elif 'content-length' in lookup:
+        length = int(lookup['content-length'])
+        if length > max_bytes:
+            raise ValueError('response too large')
+        body = await reader.readexactly(length)
+    else:
+        # Body runs until the server closes the connection
+        chunks, size = [], 0
+        while chunk := await reader.read(65536):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError('response too large')
+            chunks.append(chunk)
+        body = b''.join(chunks)
+        keep_alive = False
+    return status, reason, headers, body, keep_alive
+
+
+def request_target(url: str) -> tuple[str, str, int, str, str]:
+    """(scheme, ASCII host, port, Host header, request path) for a URL, as wget would send it.
+
+    Non-ASCII and unsafe characters in the path and query are percent-encoded
+    (existing %XX escapes are kept) and internationalized host names are IDNA-encoded.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f'unsupported URL: {url}')
+    host = parts.hostname if parts.hostname.isascii() else parts.hostname.encode('idna').decode('ascii')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    host_header = (f'[{host}]' if ':' in host else host) + (f':{parts.port}' if parts.port else '')
+    path = quote(parts.path or '/', safe="/%:@!$&'()*+,;=~")
+    if parts.query:
+        path += '?' + quote(parts.query, safe="/?%:@!$&'()*+,;=~")
+    return parts.scheme, host, port, host_header, path
+
+
+async def _request(pool: ConnectionPool, url: str, timeout: float, max_bytes: int) -> HttpResponse:
+    scheme, host, port, host_header, path = request_target(url)
+    key = (scheme, host, port)
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host_header}\r\n"
+        f"User-Agent: {USER_AGENT}\r\n"
+        "Accept: text/html,application/xhtml+xml,*/*;q=0.8\r\n"
+        "Accept-Encoding: identity\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    ).encode('ascii')
+
+    async def exchange(reader, writer):
+        writer.write(request)
+        await writer.drain()
+        return await _read_response(reader, max_bytes)
+
+    fresh = False
+    while True:
+        reader, writer, reused = await pool.acquire(key, fresh=fresh)
+        reusable = False
+        try:
+            status, reason, headers, body, reusable = await asyncio.wait_for(exchange(reader, writer), timeout)
+        except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError):
+            # The server may have dropped an idle keep-alive connection; retry once on a new one
+            if not reused:
+                raise
+            fresh = True
+            continue
+        finally:
+            pool.release(key, reader, writer, reusable)
+        return HttpResponse(url, status, reason, headers, body)
+
+
+async def fetch_url(
+    url: str,
+    pool: ConnectionPool,
+    limiter: HostRateLimiter,
+    timeout: float = 10.0,
+    max_retries: int = 2,
+    backoff: float = 0.5,
+    max_redirects: int = 5,
+    max_bytes: int = MAX_RESPONSE_BYTES,
+) -> tuple[FetchResult, HttpResponse | None]:
+    """GET one URL, following redirects and retrying errors, 429 and 5xx with exponential backoff."""
+    start = time.perf_counter()
+    current = url
+    retries = redirects = 0
+    while True:
+        response, error, permanent = None, None, False
+        await limiter.wait(urlsplit(current).hostname or '')
+        try:
+            response = await _request(pool, current, timeout, max_bytes)
+        except ValueError as e:
+            error, permanent = f'{type(e).__name__}: {e}', True
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            error = type(e).__name__
+
+        if response is not None and response.status in REDIRECT_STATUSES and redirects < max_redirects:
+            location = response.header('location')
+            if location:
+                current = urljoin(current, location)
+                redirects += 1
+                continue
+
+        retryable = not permanent and (response is None or response.status in RETRY_STATUSES)
+        if not retryable or retries >= max_retries:
+            break
+        retries += 1
+        delay = backoff * 2 ** (retries - 1)
+        retry_after = response.header('retry-after') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        await asyncio.sleep(min(delay, MAX_BACKOFF_SECONDS) * random.uniform(1.0, 1.5))
+
+    result = FetchResult(
+        url=url,
+        final_url=current,
+        status=response.status if response is not None else None,
+        seconds=time.perf_counter() - start,
+        num_bytes=len(response.body) if response is not None else 0,
+        attempts=retries + 1,
+        error=error,
+    )
+    return result, response
+
+
+def warc_response_record(response: HttpResponse) -> bytes:
+    """One gzip member holding a WARC response record for the fetched page."""
+    record = WarcRecord()
+    record.init_headers(record_type=WarcRecordType.response)
+    record.headers['WARC-Target-URI'] = response.url
+    record.headers['Content-Type'] = 'application/http; msgtype=response'
+    record.headers['WARC-Payload-Digest'] = 'sha1:' + base64.b32encode(hashlib.sha1(response.body).digest()).decode()
+    record.set_bytes_content(response.to_http_bytes())
+    buffer = io.BytesIO()
+    record.write(buffer, checksum_data=True)
+    return gzip.compress(buffer.getvalue())
+
+
+class WarcChunkWriter:
+    """Append response records to <prefix>_chunk_<i>.warc.gz, starting a new file every records_per_file records.
+
+    Each chunk is written under a .tmp name and renamed once complete, so a glob
+    for finished chunks never picks up a partially written file.
+    """
+
+    def __init__(self, warc_prefix: str, records_per_file: int = 1000):
+        self.warc_prefix = warc_prefix
+        self.records_per_file = records_per_file
+        self.paths = []
+        self._file = None
+        self._count = 0
+
+    def write(self, response: HttpResponse) -> None:
+        if self._file is None:
+            path = f"{self.warc_prefix}_chunk_{len(self.paths)}.warc.gz"
+            self.paths.append(path)
+            self._file = open(path + '.tmp', 'wb')
+        self._file.write(warc_response_record(response))
+        self._count += 1
+        if self._count >= self.records_per_file:
+            self._finish()
+
+    def _finish(self) -> None:
+        self._file.close()
+        os.replace(self._file.name, self.paths[-1])
+        self._file = None
+        self._count = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._finish()
+
+
+async def _fetch_all(urls: Iterable[str], writer: WarcChunkWriter, concurrency: int, max_per_host: int,
+                     requests_per_second_per_host: float | None, **fetch_kwargs):
+    pool = ConnectionPool(max_per_host, connect_timeout=fetch_kwargs.get('timeout', 10.0))
+    limiter = HostRateLimiter(requests_per_second_per_host)
+    queue = asyncio.Queue(maxsize=2 * concurrency)
+    results = []
+
+    async def worker():
+        while (url := await queue.get()) is not None:
+            result, response = await fetch_url(url, pool, limiter, **fetch_kwargs)
+            if response is not None and 200 <= response.status < 300:
+                writer.write(response)
+                result.written = True
+            results.append(result)
+
+    async def produce():
+        for url in urls:
+            await queue.put(url)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    # A fixed set of workers bounds the number of requests in flight. In a task group a
+    # worker that fails cancels the producer, which would otherwise block on a full queue
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(produce())
+            for _ in range(concurrency):
+                tasks.create_task(worker())
+    except ExceptionGroup as group:
+        raise group.exceptions[0]
+    finally:
+        await pool.close()
+    return results, pool
+
+
+def fetch_report(results: list[FetchResult], seconds: float, pool: ConnectionPool | None = None) -> dict:
+    """Throughput, latency percentiles and status/error counts for a fetch run."""
+    latencies = np.array([r.seconds for r in results if r.status is not None], dtype=np.float64)
+    percentiles = np.percentile(latencies, [50, 90, 99]) * 1000 if len(latencies) else np.zeros(3)
+    num_bytes = sum(r.num_bytes for r in results)
+    report = {
+        'urls': len(results),
+        'written': sum(r.written for r in results),
+        'retried': sum(r.attempts > 1 for r in results),
+        'statuses': dict(Counter(r.status for r in results if r.status is not None)),
+        'errors': dict(Counter(r.error for r in results if r.error is not None)),
+        'seconds': seconds,
+        'fetches_per_second': len(results) / max(seconds, 1e-9),
+        'megabytes_per_second': num_bytes / 2**20 / max(seconds, 1e-9),
+        'latency_ms': dict(zip(('p50', 'p90', 'p99'), percentiles.tolist())),
+    }
+    if pool is not None:
+        report['connections_opened'] = pool.opened
+        report['connections_reused'] = pool.reused
+    return report
+
+
+def format_fetch_report(report: dict) -> str:
+    latency = report['latency_ms']
+    lines = [
+        f"Fetched {report['urls']} URLs in {report['seconds']:.1f}s "
+        f"({report['fetches_per_second']:.1f} fetches/sec, {report['megabytes_per_second']:.2f} MB/s), "
+        f"wrote {report['written']} records",
+        f"  latency p50 {latency['p50']:.0f} ms, p90 {latency['p90']:.0f} ms, p99 {latency['p99']:.0f} ms",
+        f"  statuses: {report['statuses']}",
+    ]
+    if report['errors']:
+        lines.append(f"  errors: {report['errors']}")
+    if 'connections_opened' in report:
+        lines.append(f"  connections: {report['connections_opened']} opened, {report['connections_reused']} reused")
+    return '\n'.join(lines)
+
+
+def fetch_urls_to_warc(
+    urls: Iterable[str],
+    warc_prefix: str,
+    concurrency: int = 64,
+    max_per_host: int = 4,
+    requests_per_second_per_host: float | None = 5.0,
+    timeout: float = 10.0,
+    max_retries: int = 2,
+    backoff: float = 0.5,
+    records_per_file: int = 1000,
+    max_bytes: int = MAX_RESPONSE_BYTES,
+) -> tuple[list[FetchResult], dict]:
+    """Fetch URLs concurrently and stream every 2xx response into <warc_prefix>_chunk_<i>.warc.gz.
+
+    At most concurrency requests are in flight, at most max_per_host of them
+    to the same host over pooled keep-alive connections, and request starts to
+    each host are spaced to requests_per_second_per_host. Returns the per-URL
+    results (in completion order) and a fetch_report.
+    """
+    writer = WarcChunkWriter(warc_prefix, records_per_file)
+    start = time.perf_counter()
+    try:
+        results, pool = asyncio.run(_fetch_all(
+            urls, writer, concurrency, max_per_host, requests_per_second_per_host,
+            timeout=timeout, max_retries=max_retries, backoff=backoff, max_bytes=max_bytes,
+        ))
+    finally:
+        writer.close()
+    report = fetch_report(results, time.perf_counter() - start, pool)
+    report['warc_paths'] = list(writer.paths)
+    return results, report
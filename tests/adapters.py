@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+from collections.abc import Iterator
 from typing import Any
 
 
@@ -9,6 +10,37 @@ def run_extract_text_from_html_bytes(html_bytes: bytes) -> str | None:
     from cs336_data.extract_data import run_extract_text_from_html_bytes
     return run_extract_text_from_html_bytes(html_bytes)
 
+def run_iter_texts_from_warc(warc_path: str | os.PathLike, **kwargs) -> Iterator[tuple[str, str, str]]:
+    from cs336_data.extract_data import iter_texts_from_warc
+    return iter_texts_from_warc(warc_path, **kwargs)
+
+def run_extract_warcs_parallel(
+    warc_paths: list[str], output_dir: str, num_workers: int | None = None, **kwargs
+) -> list[dict]:
+    from cs336_data.extract_data import extract_warcs_parallel
+    return extract_warcs_parallel(warc_paths, output_dir, num_workers=num_workers, **kwargs)
+
+def run_extract_warc_to_shard(warc_path: str, output_path: str, digest_db: str | None = None) -> dict:
+    from cs336_data.extract_data import extract_warc_to_shard
+    return extract_warc_to_shard(warc_path, output_path, digest_db)
+
+def run_digest_set(path: str | None = None, max_size: int | None = None):
+    from cs336_data.extract_data import DigestSet, DiskDigestSet
+    if path is not None:
+        return DiskDigestSet(path)
+    return DigestSet(max_size=max_size)
+
+def run_build_warc_index(warc_path: str, save: bool = True):
+    from cs336_data.extract_data import WarcIndex
+    index = WarcIndex.build(warc_path)
+    if save:
+        index.save()
+    return index
+
+def run_load_warc_index(warc_path: str):
+    from cs336_data.extract_data import WarcIndex
+    return WarcIndex.load(warc_path)
+
 def run_identify_language(text: str) -> tuple[Any, float]:
     from cs336_data.language_identification import run_identify_language
     return run_identify_language(text)
@@ -25,6 +57,18 @@ def run_mask_ips(text: str) -> tuple[str, int]:
     from cs336_data.mask_pii import mask_ip_address
     return mask_ip_address(text)
 
+def run_mask_pii(text: str) -> tuple[str, dict[str, int]]:
+    from cs336_data.mask_pii import PIIMasker
+    return PIIMasker().mask(text)
+
+def run_detect_pii_batch(texts: list[str], num_workers: int | None = None) -> list:
+    from cs336_data.mask_pii import detect_pii_batch
+    return list(detect_pii_batch(texts, num_workers=num_workers, chunk_size=2))
+
+def run_apply_pii_spans(text: str, spans) -> str:
+    from cs336_data.mask_pii import PIIMasker
+    return PIIMasker().apply_spans(text, spans)
+
 def run_classify_nsfw(text: str) -> tuple[Any, float]:
     from cs336_data.harmful_content import classify_nsfw
     return classify_nsfw(text)
@@ -36,25 +80,77 @@ def run_classify_toxic_speech(text: str) -> tuple[Any, float]:
 def run_classify_quality(text: str) -> tuple[Any, float]:
     model_path = "quality_classifier.bin"
     from cs336_data.quality_classifier import classify_string
-    import fasttext
-    model = fasttext.load_model(model_path)
+    from cs336_data.model_registry import get_model
+    model = get_model(model_path)
     return classify_string(model, text)
 
-def run_gopher_quality_filter(text: str) -> bool:
+def run_gopher_quality_filter(text: str, fast: bool = False) -> bool:
     from cs336_data.gopher_filter import run_gopher_quality_filter
-    return run_gopher_quality_filter(text)
+    return run_gopher_quality_filter(text, fast=fast)
+
+
+def run_compute_gopher_stats(text: str):
+    from cs336_data.gopher_filter import compute_gopher_stats
+    return compute_gopher_stats(text)
+
+def run_gopher_full_filter(text: str) -> bool:
+    from cs336_data.gopher_filter import run_gopher_full_filter
+    return run_gopher_full_filter(text)
+
+
+def run_sample_urls(urls_file: os.PathLike, n: int, output_file: os.PathLike, seed: int | None = None):
+    from cs336_data.quality_classifier import sample_urls
+    return sample_urls(str(urls_file), n=n, output_file=str(output_file), seed=seed)
+
+
+def run_prepare_fasttext_data(positive_texts, negative_texts, output_file: os.PathLike, **kwargs) -> str:
+    from cs336_data.quality_classifier import prepare_fasttext_data
+    return prepare_fasttext_data(positive_texts, negative_texts, str(output_file), **kwargs)
+
+
+def run_step_cache(root: str | os.PathLike):
+    from cs336_data.step_cache import StepCache
+    return StepCache(str(root))
+
+
+def run_request_target(url: str) -> tuple[str, str, int, str, str]:
+    from cs336_data.warc_fetcher import request_target
+    return request_target(url)
+
+
+def run_fetch_urls_to_warc(urls: list[str], warc_prefix: str | os.PathLike, **kwargs):
+    from cs336_data.warc_fetcher import fetch_urls_to_warc
+    return fetch_urls_to_warc(urls, str(warc_prefix), **kwargs)
 
 
 def run_exact_line_deduplication(
-    input_files: list[os.PathLike], output_directory: os.PathLike
+    input_files: list[os.PathLike], output_directory: os.PathLike, **kwargs
 ):
     from cs336_data.deduplication import run_exact_line_deduplication
     return run_exact_line_deduplication(
         input_files=input_files,
         output_dir=output_directory,
+        **kwargs,
     )
 
 
+def run_line_hash_counter(capacity: int = 1 << 16):
+    from cs336_data.deduplication import LineHashCounter
+    return LineHashCounter(capacity)
+
+
+def run_approximate_line_deduplication(
+    input_files: list[os.PathLike], output_directory: os.PathLike, **kwargs
+) -> dict[str, float]:
+    from cs336_data.deduplication import run_approximate_line_deduplication
+    return run_approximate_line_deduplication(input_files, output_directory, **kwargs)
+
+
+def run_write_synthetic_corpus(output_dir: os.PathLike, num_files: int, **kwargs) -> list[str]:
+    from cs336_data.deduplication import write_synthetic_corpus
+    return write_synthetic_corpus(str(output_dir), num_files, **kwargs)
+
+
 def run_minhash_deduplication(
     input_files: list[os.PathLike],
     num_hashes: int,
@@ -1,3 +1,23 @@
 import pathlib
 
 FIXTURES_PATH = (pathlib.Path(__file__).resolve().parent) / "fixtures"
+
+
+def write_warc(path, responses):
+    """Write (url, content_type, body) tuples as HTTP response records to a WARC file."""
+    import base64
+    import hashlib
+
+    from fastwarc.warc import WarcRecord, WarcRecordType
+
+    with open(path, "wb") as f:
+        for url, content_type, body in responses:
+            record = WarcRecord()
+            record.init_headers(record_type=WarcRecordType.response)
+            record.headers["WARC-Target-URI"] = url
+            record.headers["Content-Type"] = "application/http; msgtype=response"
+            record.headers["WARC-Payload-Digest"] = "sha1:" + base64.b32encode(hashlib.sha1(body).digest()).decode()
+            http_headers = f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n\r\n".encode()
+            record.set_bytes_content(http_headers + body)
+            record.write(f, checksum_data=True)
+    return path
@@ -0,0 +1,21 @@
+import fasttext
+import pytest
+
+from cs336_data import model_registry
+
+
+@pytest.fixture
+def tiny_model_path(tmp_path):
+    """A small two-label fastText model trained on the fly, with the model registry reset around the test."""
+    train_path = tmp_path / "train.txt"
+    lines = []
+    for i in range(50):
+        lines.append(f"__label__high_quality the history of science and the study of nature {i}")
+        lines.append(f"__label__low_quality buy now click here free shipping deals {i}")
+    train_path.write_text("\n".join(lines))
+    model = fasttext.train_supervised(input=str(train_path), epoch=5, dim=10, thread=1, verbose=0)
+    model_path = tmp_path / "tiny.bin"
+    model.save_model(str(model_path))
+    model_registry.unload_models()
+    yield str(model_path)
+    model_registry.unload_models()
@@ -0,0 +1,64 @@
+from cs336_data.classifier_stage import ClassifierRule, ClassifierStage, collapse_whitespace
+from cs336_data.model_registry import get_model
+from cs336_data.quality_classifier import classify_string
+
+
+def test_classifier_stage_short_circuits(tiny_model_path):
+    stage = ClassifierStage([
+        ClassifierRule("quality", tiny_model_path, lambda label, score: label == "high_quality"),
+        ClassifierRule("second", tiny_model_path, lambda label, score: True),
+    ])
+    texts = [
+        "the history of science\nand the study of nature",
+        "buy now click here free shipping deals",
+    ] * 3
+
+    results = [stage(text) for text in texts]
+    assert [result.keep for result in results] == [True, False] * 3
+    assert [result.rejected_by for result in results] == [None, "quality"] * 3
+    # Rejected documents never reach the second model
+    assert stage.calls == {"quality": 6, "second": 3}
+    assert list(results[1].predictions) == ["quality"]
+
+    batch_results = stage.run_batch(texts)
+    assert [result.keep for result in batch_results] == [result.keep for result in results]
+    for batch_result, result in zip(batch_results, results):
+        assert batch_result.predictions.keys() == result.predictions.keys()
+        for name, (label, score) in result.predictions.items():
+            assert batch_result.predictions[name][0] == label
+            assert abs(batch_result.predictions[name][1] - score) < 1e-5
+
+    assert list(stage.filter(texts, batch_size=4)) == texts[0::2]
+    assert "quality" in stage.report()
+
+
+def test_classifier_stage_filter_in_shared_model_pool(tiny_model_path):
+    stage = ClassifierStage([
+        ClassifierRule("quality", tiny_model_path, lambda label, score: label == "high_quality"),
+        ClassifierRule("second", tiny_model_path, lambda label, score: True),
+    ])
+    texts = [f"the history of science number {i}" if i % 3 else f"buy now click here deal {i}" for i in range(50)]
+
+    expected = list(stage.filter(texts, batch_size=4))
+    sequential_calls = dict(stage.calls)
+    stage.calls = dict.fromkeys(stage.calls, 0)
+    assert list(stage.filter(iter(texts), batch_size=4, num_workers=2)) == expected
+    # The workers' calls are merged back into the parent's counters
+    assert stage.calls == sequential_calls
+
+
+def test_classifier_stage_matches_single_document_preprocessing(tiny_model_path):
+    stage = ClassifierStage([
+        ClassifierRule("newlines", tiny_model_path, lambda label, score: True),
+        ClassifierRule("collapsed", tiny_model_path, lambda label, score: True, normalize=collapse_whitespace),
+    ])
+    model = get_model(tiny_model_path)
+    texts = [
+        "the history\tof science\n\nand   the study of nature",
+        "buy now\u00a0click here\u2003free\r\nshipping",
+    ]
+    for results in ([stage(text) for text in texts], stage.run_batch(texts)):
+        for text, result in zip(texts, results):
+            labels, scores = model.predict(text.replace("\n", " "), k=1)
+            assert result.predictions["newlines"] == (labels[0].replace("__label__", ""), float(scores[0]))
+            assert result.predictions["collapsed"] == classify_string(model, text)
@@ -1,8 +1,17 @@
 import logging
+import tracemalloc
+from collections import Counter
 
+import numpy as np
 from xopen import xopen
 
-from .adapters import run_exact_line_deduplication, run_minhash_deduplication
+from .adapters import (
+    run_approximate_line_deduplication,
+    run_exact_line_deduplication,
+    run_line_hash_counter,
+    run_minhash_deduplication,
+    run_write_synthetic_corpus,
+)
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -40,6 +49,107 @@ def test_exact_line_deduplication(tmp_path):
     assert len(deduplicated_documents) == 0
 
 
+def _corpus_with_edge_cases(tmp_path):
+    paths = run_write_synthetic_corpus(tmp_path / "corpus", num_files=60, lines_per_file=50, duplicate_fraction=0.3)
+    (tmp_path / "corpus" / "empty.txt").write_bytes(b"")
+    (tmp_path / "corpus" / "no_newline.txt").write_bytes(b"unique last line\nboilerplate line 0 shared across documents")
+    (tmp_path / "corpus" / "blank_lines.txt").write_bytes(b"\n\nonly here\n")
+    # Longer than the smallest copy block, so it is carried across block reads
+    (tmp_path / "corpus" / "long_line.txt").write_bytes(b"x" * 10_000 + b"\n\n" + b"y" * 10_000)
+    names = ("empty.txt", "no_newline.txt", "blank_lines.txt", "long_line.txt")
+    return paths + [str(tmp_path / "corpus" / name) for name in names]
+
+
+def _read_outputs(directory):
+    return {path.name: path.read_bytes() for path in directory.iterdir()}
+
+
+def test_parallel_exact_line_deduplication_matches_sequential(tmp_path):
+    paths = _corpus_with_edge_cases(tmp_path)
+    run_exact_line_deduplication(paths, tmp_path / "sequential")
+    run_exact_line_deduplication(paths, tmp_path / "parallel", num_workers=3)
+
+    sequential = _read_outputs(tmp_path / "sequential")
+    assert len(sequential) == len(paths)
+    assert sequential == _read_outputs(tmp_path / "parallel")
+    assert sequential["no_newline.txt"] == b"unique last line\n"
+    assert sequential["blank_lines.txt"] == b"only here\n"
+    assert sequential["long_line.txt"] == b"x" * 10_000 + b"\n" + b"y" * 10_000 + b"\n"
+
+
+def test_exact_line_deduplication_empty_input(tmp_path):
+    run_exact_line_deduplication([], tmp_path / "sequential")
+    run_exact_line_deduplication([], tmp_path / "parallel", num_workers=2)
+    run_exact_line_deduplication([], tmp_path / "external", memory_budget_bytes=1)
+    for name in ("sequential", "parallel", "external"):
+        assert _read_outputs(tmp_path / name) == {}
+
+
+def test_external_exact_line_deduplication_matches_sequential(tmp_path):
+    paths = _corpus_with_edge_cases(tmp_path)
+    run_exact_line_deduplication(paths, tmp_path / "sequential")
+    # The smallest budget spills a run every 1024 lines and merges them two at a time
+    run_exact_line_deduplication(paths, tmp_path / "tiny_budget", memory_budget_bytes=1)
+    tracemalloc.start()
+    run_exact_line_deduplication(paths, tmp_path / "one_mib", memory_budget_bytes=1 << 20)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    sequential = _read_outputs(tmp_path / "sequential")
+    assert sequential == _read_outputs(tmp_path / "tiny_budget")
+    assert sequential == _read_outputs(tmp_path / "one_mib")
+    assert peak < 1 << 20
+
+
+def test_approximate_line_deduplication_against_exact(tmp_path):
+    paths = run_write_synthetic_corpus(tmp_path / "corpus", num_files=100, lines_per_file=100, duplicate_fraction=0.3)
+    run_exact_line_deduplication(paths, tmp_path / "exact")
+    exact = {name: contents.splitlines() for name, contents in _read_outputs(tmp_path / "exact").items()}
+    exact_kept = sum(len(lines) for lines in exact.values())
+
+    for memory_bytes, max_drop_rate in ((1 << 16, 0.01), (256, 1.0)):
+        output_dir = tmp_path / f"approximate_{memory_bytes}"
+        stats = run_approximate_line_deduplication(paths, output_dir, memory_bytes=memory_bytes, error_rate=1e-3)
+        approximate = {name: contents.splitlines() for name, contents in _read_outputs(output_dir).items()}
+        assert approximate.keys() == exact.keys()
+        # Every duplicated line is dropped; only unique lines can be lost to false positives
+        for name, lines in approximate.items():
+            assert set(lines) <= set(exact[name])
+        drop_rate = 1 - sum(len(lines) for lines in approximate.values()) / exact_kept
+        assert drop_rate <= max_drop_rate
+        assert stats["estimated_false_positive_rate"] <= max_drop_rate
+    assert drop_rate > 0.5
+    assert stats["estimated_false_positive_rate"] > 0.5
+
+
+def test_line_hash_counter_matches_counter():
+    rng = np.random.default_rng(0)
+    random_keys = rng.integers(0, 2**64, size=3000, dtype=np.uint64)
+    # Keys that share their low bits all start probing at the same slot
+    clustered_keys = (np.arange(1, 200, dtype=np.uint64) << np.uint64(40))
+    keys = np.concatenate([random_keys, clustered_keys, np.zeros(1, dtype=np.uint64)])
+
+    counter = run_line_hash_counter(capacity=16)
+    expected = Counter()
+    for _ in range(4):
+        batch = rng.choice(keys, size=2000)
+        counter.add(batch)
+        expected.update(batch.tolist())
+    # One key added far more often than the uint8 count can hold
+    counter.add(np.full(600, keys[0], dtype=np.uint64))
+    expected[int(keys[0])] += 600
+
+    assert len(counter) == len(expected)
+    # 9 bytes per slot and at least 35% of the slots in use after growing
+    assert counter.nbytes / len(counter) < 9 * 2 / 0.7
+    counts = counter.get(keys)
+    for key, count in zip(keys.tolist(), counts.tolist()):
+        assert count == min(expected[key], 255)
+    unseen = rng.integers(0, 2**64, size=100, dtype=np.uint64)
+    unseen = unseen[~np.isin(unseen, keys)]
+    assert not counter.get(unseen).any()
+
+
 def test_minhash_deduplication_exact_duplicates(tmp_path):
     """
     Check that minhash deduplication properly identifies and removes exact duplicates.
@@ -1,7 +1,24 @@
+import io
+import json
 import logging
+import multiprocessing
+import time
+import types
+from collections import Counter
 
-from .adapters import run_extract_text_from_html_bytes
-from .common import FIXTURES_PATH
+import pytest
+from fastwarc.warc import ArchiveIterator
+
+from .adapters import (
+    run_build_warc_index,
+    run_digest_set,
+    run_extract_text_from_html_bytes,
+    run_extract_warc_to_shard,
+    run_extract_warcs_parallel,
+    run_iter_texts_from_warc,
+    run_load_warc_index,
+)
+from .common import FIXTURES_PATH, write_warc
 
 logger = logging.getLogger(__name__)
 
@@ -14,3 +31,240 @@ def test_extract_text_from_html_bytes():
     with open(moby_expected_path) as f:
         moby_expected_text = f.read()
     assert moby_expected_text == run_extract_text_from_html_bytes(moby_bytes)
+
+
+def test_iter_texts_from_warc(tmp_path):
+    with open(FIXTURES_PATH / "moby.html", "rb") as f:
+        moby_bytes = f.read()
+    with open(FIXTURES_PATH / "moby_extracted.txt") as f:
+        moby_expected_text = f.read()
+    warc_path = write_warc(
+        tmp_path / "sample.warc",
+        [
+            ("http://example.com/moby", "text/html", moby_bytes),
+            ("http://example.com/hello", "text/html", b"<html><body><p>Hello</p></body></html>"),
+        ],
+    )
+    records = run_iter_texts_from_warc(str(warc_path))
+    assert isinstance(records, types.GeneratorType)
+
+    record_id, url, text = next(records)
+    assert record_id.startswith("<urn:uuid:")
+    assert url == "http://example.com/moby"
+    assert text == moby_expected_text
+
+    _, url, text = next(records)
+    assert url == "http://example.com/hello"
+    assert text == "Hello"
+    assert next(records, None) is None
+
+
+def test_iter_texts_from_warc_skips_non_html(tmp_path):
+    warc_path = write_warc(
+        tmp_path / "mixed.warc",
+        [
+            ("http://example.com/logo.png", "image/png", b"\x89PNG" + bytes(64)),
+            ("http://example.com/paper.pdf", "application/pdf", b"%PDF-1.4"),
+            ("http://example.com/page", "text/html; charset=utf-8", b"<p>Kept page</p>"),
+            ("http://example.com/big", "text/html", b"<p>" + b"x" * 1000 + b"</p>"),
+            ("http://example.com/empty", "text/html", b""),
+        ],
+    )
+    skipped = Counter()
+    records = list(run_iter_texts_from_warc(str(warc_path), max_content_length=512, skipped=skipped))
+    assert [(url, text) for _, url, text in records] == [("http://example.com/page", "Kept page")]
+    assert skipped == Counter({"not_html": 2, "too_large": 1, "empty": 1})
+
+
+def test_iter_texts_from_warc_readahead(tmp_path):
+    responses = [
+        (f"http://example.com/{i}", "image/gif" if i % 5 == 0 else "text/html", f"<p>Page {i}</p>".encode())
+        for i in range(50)
+    ]
+    warc_path = str(write_warc(tmp_path / "readahead.warc", responses))
+    expected = list(run_iter_texts_from_warc(warc_path))
+
+    skipped = Counter()
+    assert list(run_iter_texts_from_warc(warc_path, skipped=skipped, readahead_records=4)) == expected
+    assert skipped == Counter({"not_html": 10})
+
+    # Stopping early must not hang on the blocked producer thread
+    records = run_iter_texts_from_warc(warc_path, readahead_records=2)
+    assert next(records) == expected[0]
+    records.close()
+
+
+def test_iter_texts_from_warc_skips_duplicate_digests(tmp_path):
+    page = b"<p>Mirrored page</p>"
+    first = write_warc(
+        tmp_path / "first.warc",
+        [
+            ("http://a.example.com/", "text/html", page),
+            ("http://b.example.com/", "text/html", page),
+            ("http://c.example.com/", "text/html", b"<p>Unique page</p>"),
+        ],
+    )
+    second = write_warc(tmp_path / "second.warc", [("http://d.example.com/", "text/html", page)])
+
+    skipped = Counter()
+    seen_digests = run_digest_set()
+    urls = [url for _, url, _ in run_iter_texts_from_warc(str(first), skipped=skipped, seen_digests=seen_digests)]
+    assert urls == ["http://a.example.com/", "http://c.example.com/"]
+    assert skipped == Counter({"duplicate_digest": 1})
+    assert len(seen_digests) == 2
+
+    # A bounded set forgets the oldest digests
+    bounded = run_digest_set(max_size=1)
+    assert bounded.add("sha1:A") and bounded.add("sha1:B") and bounded.add("sha1:A")
+    assert len(bounded) == 1
+
+    # The on-disk set carries seen digests over to later shards and runs
+    db_path = str(tmp_path / "digests.sqlite")
+    with run_digest_set(db_path) as seen_digests:
+        assert len(list(run_iter_texts_from_warc(str(first), seen_digests=seen_digests))) == 2
+    with run_digest_set(db_path) as seen_digests:
+        assert list(run_iter_texts_from_warc(str(second), seen_digests=seen_digests)) == []
+
+
+def test_extract_warc_to_shard_withdraws_digests_of_failed_shard(tmp_path, monkeypatch):
+    responses = [(f"http://example.com/{i}", "text/html", f"<p>Page {i}</p>".encode()) for i in range(3)]
+    warc_path = str(write_warc(tmp_path / "shard.warc", responses))
+    output_path = str(tmp_path / "shard.jsonl")
+    digest_db = str(tmp_path / "digests.sqlite")
+
+    def fail_on_last_page(html_bytes):
+        if b"Page 2" in html_bytes:
+            raise ValueError("extraction crashed")
+        return html_bytes.decode()
+
+    with monkeypatch.context() as patch:
+        patch.setattr("cs336_data.extract_data.run_extract_text_from_html_bytes", fail_on_last_page)
+        with pytest.raises(ValueError):
+            run_extract_warc_to_shard(warc_path, output_path, digest_db)
+    assert not (tmp_path / "shard.jsonl.tmp").exists()
+
+    # The rerun must not treat the failed attempt's payloads as duplicates
+    stats = run_extract_warc_to_shard(warc_path, output_path, digest_db)
+    assert stats["num_docs"] == 3
+    assert stats["skipped"] == {}
+
+
+def test_disk_digest_set_with_readahead(tmp_path):
+    page = b"<p>Mirrored page</p>"
+    responses = [(f"http://{i}.example.com/", "text/html", page if i % 2 else f"<p>{i}</p>".encode()) for i in range(20)]
+    warc_path = str(write_warc(tmp_path / "mirrors.warc", responses))
+
+    skipped = Counter()
+    with run_digest_set(str(tmp_path / "digests.sqlite")) as seen_digests:
+        texts = list(run_iter_texts_from_warc(warc_path, skipped=skipped, readahead_records=4, seen_digests=seen_digests))
+    assert len(texts) == 11
+    assert skipped == Counter({"duplicate_digest": 9})
+
+
+def _add_digest_and_wait(db_path, results, release):
+    with run_digest_set(db_path) as seen_digests:
+        results.put((seen_digests.add("second"), "first" in seen_digests))
+        # Keep the connection open while the other process writes
+        release.wait(timeout=30)
+
+
+def test_disk_digest_set_writers_do_not_block_each_other(tmp_path):
+    db_path = str(tmp_path / "digests.sqlite")
+    results, release = multiprocessing.Queue(), multiprocessing.Event()
+    with run_digest_set(db_path) as seen_digests:
+        assert seen_digests.add("first")
+        writer = multiprocessing.Process(target=_add_digest_and_wait, args=(db_path, results, release))
+        writer.start()
+        try:
+            # The other process can write, and sees our digest, while our connection stays open
+            assert results.get(timeout=10) == (True, True)
+            start = time.perf_counter()
+            assert seen_digests.add("third")
+            assert not seen_digests.add("second")
+            assert time.perf_counter() - start < 5
+        finally:
+            release.set()
+            writer.join(timeout=30)
+    assert writer.exitcode == 0
+
+
+def test_extract_warcs_parallel_resumes(tmp_path):
+    warc_paths = []
+    for i in range(3):
+        body = f"<html><body><p>Shard {i}</p></body></html>".encode()
+        warc_paths.append(str(write_warc(tmp_path / f"shard{i}.warc", [(f"http://example.com/{i}", "text/html", body)])))
+    output_dir = tmp_path / "out"
+
+    results = run_extract_warcs_parallel(warc_paths, str(output_dir), num_workers=2)
+    assert [entry["input"] for entry in results] == warc_paths
+    for i, entry in enumerate(results):
+        assert entry["output"] == str(output_dir / f"shard{i}.jsonl")
+        with open(entry["output"]) as f:
+            docs = [json.loads(line) for line in f]
+        assert [doc["text"] for doc in docs] == [f"Shard {i}"]
+        assert docs[0]["url"] == f"http://example.com/{i}"
+
+    # Drop one shard's output; a rerun should only redo that shard
+    (output_dir / "shard1.jsonl").unlink()
+    mtime = (output_dir / "shard0.jsonl").stat().st_mtime_ns
+    results = run_extract_warcs_parallel(warc_paths, str(output_dir), num_workers=2)
+    assert [entry["input"] for entry in results] == warc_paths
+    assert (output_dir / "shard1.jsonl").exists()
+    assert (output_dir / "shard0.jsonl").stat().st_mtime_ns == mtime
+
+
+def test_extract_warcs_parallel_reports_failed_shard(tmp_path):
+    good = str(write_warc(tmp_path / "good.warc", [("http://example.com/", "text/html", b"<p>Fine</p>")]))
+    missing = str(tmp_path / "missing.warc")
+    output_dir = tmp_path / "out"
+
+    with pytest.raises(RuntimeError, match="missing.warc"):
+        run_extract_warcs_parallel([good, missing], str(output_dir), num_workers=2)
+    # The good shard still finished and was recorded, and nothing partial is left behind
+    assert (output_dir / "good.jsonl").exists()
+    assert not list(output_dir.glob("*.tmp"))
+    with open(output_dir / "manifest.jsonl") as f:
+        assert [json.loads(line)["input"] for line in f] == [good]
+
+
+def test_extract_warcs_parallel_same_file_name_in_different_directories(tmp_path):
+    warc_paths = []
+    for crawl in ("crawl-a", "crawl-b"):
+        (tmp_path / crawl).mkdir()
+        body = f"<p>From {crawl}</p>".encode()
+        warc_paths.append(str(write_warc(tmp_path / crawl / "shard.warc", [("http://example.com/", "text/html", body)])))
+    output_dir = tmp_path / "out"
+
+    results = run_extract_warcs_parallel(warc_paths, str(output_dir), num_workers=2)
+    assert len({entry["output"] for entry in results}) == 2
+    for crawl, entry in zip(("crawl-a", "crawl-b"), results):
+        with open(entry["output"]) as f:
+            assert [json.loads(line)["text"] for line in f] == [f"From {crawl}"]
+
+    # The names are stable, so a rerun finds both shards finished
+    assert run_extract_warcs_parallel(warc_paths, str(output_dir), num_workers=2) == results
+
+
+def test_warc_index_random_access(tmp_path):
+    responses = [
+        (f"http://example.com/{i}", "image/png" if i % 4 == 3 else "text/html", f"<p>Page {i}</p>".encode())
+        for i in range(20)
+    ]
+    warc_path = str(write_warc(tmp_path / "indexed.warc", responses))
+    run_build_warc_index(warc_path)
+    index = run_load_warc_index(warc_path)
+
+    assert len(index) == 20
+    assert index.url(13) == "http://example.com/13"
+    record = next(ArchiveIterator(io.BytesIO(index.read_record_bytes(13)), parse_http=True))
+    assert record.headers.get("WARC-Target-URI") == "http://example.com/13"
+    assert record.reader.read() == b"<p>Page 13</p>"
+
+    assert [url for _, url, _ in index.iter_texts(5, 8)] == [f"http://example.com/{i}" for i in (5, 6)]
+
+    # Byte-balanced shards cover every record exactly once, in order
+    shards = index.split(3)
+    assert shards[0][0] == 0 and shards[-1][1] == 20
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+    sharded = [text for start, stop in shards for _, _, text in index.iter_texts(start, stop)]
+    assert sharded == [text for _, _, text in run_iter_texts_from_warc(warc_path)]
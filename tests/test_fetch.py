@@ -0,0 +1,145 @@
+import glob
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from .adapters import run_fetch_urls_to_warc, run_iter_texts_from_warc, run_request_target
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    hits = Counter()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        if self.path.startswith("/page/"):
+            name = self.path.rsplit("/", 1)[1]
+            self._send(200, f"<html><body><p>Page {name} content</p></body></html>".encode())
+        elif self.path == "/flaky":
+            if self.hits[self.path] == 1:
+                self._send(503, b"try again")
+            else:
+                self._send(200, b"<html><body><p>Recovered</p></body></html>")
+        elif self.path == "/redirect":
+            self._send(302, headers=[("Location", "/page/target")])
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for part in (b"<html><body><p>Chunked ", b"body</p></body></html>"):
+                self.wfile.write(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send(404, b"not found")
+
+
+@pytest.fixture
+def local_server():
+    _Handler.hits.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_urls_to_warc(tmp_path, local_server):
+    pages = [f"{local_server}/page/{i}" for i in range(40)]
+    extra = [f"{local_server}/{path}" for path in ("flaky", "redirect", "chunked", "missing")]
+    results, report = run_fetch_urls_to_warc(
+        pages + extra, tmp_path / "fetched", concurrency=8, max_per_host=2,
+        requests_per_second_per_host=None, backoff=0.01, records_per_file=16,
+    )
+
+    by_url = {result.url: result for result in results}
+    assert len(by_url) == 44
+    assert by_url[f"{local_server}/flaky"].attempts == 2
+    assert by_url[f"{local_server}/redirect"].final_url == f"{local_server}/page/target"
+    assert by_url[f"{local_server}/missing"].status == 404
+    assert not by_url[f"{local_server}/missing"].written
+
+    # Finished chunks only, and every 2xx response is readable by the extractor
+    warc_paths = sorted(glob.glob(str(tmp_path / "fetched_chunk_*.warc.gz")))
+    assert warc_paths == sorted(report["warc_paths"]) and len(warc_paths) == 3
+    texts = {url: text for path in warc_paths for _, url, text in run_iter_texts_from_warc(path)}
+    assert set(texts) == set(pages) | {f"{local_server}/page/target", f"{local_server}/flaky", f"{local_server}/chunked"}
+    assert "Page 7 content" in texts[f"{local_server}/page/7"]
+    assert "Chunked body" in texts[f"{local_server}/chunked"]
+
+    assert report["written"] == 43
+    assert report["statuses"][200] == 43
+    assert report["connections_opened"] <= 4
+    assert report["connections_reused"] > 0
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+
+
+def test_fetch_rate_limit_and_errors(tmp_path, local_server):
+    urls = [f"{local_server}/page/{i}" for i in range(5)]
+    start = time.perf_counter()
+    _, report = run_fetch_urls_to_warc(urls, tmp_path / "limited", concurrency=5, requests_per_second_per_host=20)
+    assert time.perf_counter() - start >= 0.2
+    assert report["written"] == 5
+
+    # Connection refused is retried, then reported without writing anything
+    results, report = run_fetch_urls_to_warc(
+        ["http://127.0.0.1:1/nothing", "ftp://example.com/file"], tmp_path / "errors", max_retries=1, backoff=0.01,
+    )
+    by_url = {result.url: result for result in results}
+    assert by_url["http://127.0.0.1:1/nothing"].attempts == 2
+    assert by_url["ftp://example.com/file"].attempts == 1
+    assert report["written"] == 0 and report["warc_paths"] == []
+
+
+def test_fetch_non_ascii_urls(tmp_path, local_server):
+    urls = [f"{local_server}/page/café?q=naïve", f"{local_server}/page/already%20encoded"]
+    results, report = run_fetch_urls_to_warc(urls, tmp_path / "unicode", requests_per_second_per_host=None)
+    assert [result.status for result in results] == [200, 200]
+    assert report["written"] == 2
+    # Sent percent-encoded like wget, without double-encoding existing escapes
+    assert _Handler.hits["/page/caf%C3%A9?q=na%C3%AFve"] == 1
+    assert _Handler.hits["/page/already%20encoded"] == 1
+
+    assert run_request_target("https://bücher.example/straße?x=ü") == (
+        "https", "xn--bcher-kva.example", 443, "xn--bcher-kva.example", "/stra%C3%9Fe?x=%C3%BC"
+    )
+    assert run_request_target("http://[::1]:8080/")[3] == "[::1]:8080"
+
+
+def test_fetch_urls_to_warc_raises_when_workers_fail(tmp_path, monkeypatch):
+    async def broken_fetch_url(url, *args, **kwargs):
+        raise RuntimeError(f"unexpected failure on {url}")
+
+    monkeypatch.setattr("cs336_data.warc_fetcher.fetch_url", broken_fetch_url)
+    errors = []
+
+    def fetch():
+        try:
+            # Far more URLs than fit in the queue, so a stuck producer would block forever
+            run_fetch_urls_to_warc([f"http://example.com/{i}" for i in range(100)], tmp_path / "broken", concurrency=2)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+    assert "unexpected failure" in str(errors[0])
@@ -25,3 +25,38 @@ def test_identify_language_chinese_simplified():
     assert predicted_language == "zh"
     assert isinstance(score, float)
     assert score > 0
+
+
+def test_identify_language_fast_scores_bounded_prefix(tiny_model_path, monkeypatch):
+    # The fast path only depends on the model's interface, so a tiny local model stands in for lid.176.bin
+    from cs336_data import language_identification
+
+    monkeypatch.setattr(language_identification, "model_path", tiny_model_path)
+
+    short_text = "the history of science\nand the study of nature"
+    label, score, chars_scored = language_identification.identify_language_fast(short_text)
+    assert (label, score) == language_identification.run_identify_language(short_text)
+    assert chars_scored == len(short_text)
+
+    long_text = "the history of science and the study of nature. " * 5000
+    label, score, chars_scored = language_identification.identify_language_fast(
+        long_text, window_chars=1000, num_windows=4
+    )
+    assert label == language_identification.run_identify_language(long_text)[0]
+    assert isinstance(score, float)
+    # Each window is scored once, so the work is linear in the number of windows
+    assert 1000 <= chars_scored <= 4 * 1000
+
+    # An unreachable threshold scores every window exactly once
+    label, score, chars_scored = language_identification.identify_language_fast(
+        long_text, window_chars=1000, num_windows=4, min_confidence=1.01
+    )
+    assert label == language_identification.run_identify_language(long_text)[0]
+    assert 3 * 1000 < chars_scored <= 4 * 1000
+    assert 0.0 < score <= 1.0 + 1e-6
+
+    # A confident prefix stops after the first window
+    _, _, chars_scored = language_identification.identify_language_fast(
+        long_text, window_chars=1000, min_confidence=0.0
+    )
+    assert chars_scored == 1000
@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from cs336_data import model_registry
+
+from .common import FIXTURES_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def test_get_model_loads_once(tiny_model_path):
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(model_registry.get_model(tiny_model_path))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loaded) == 8
+    assert all(model is loaded[0] for model in loaded)
+
+    info = model_registry.model_info()
+    assert list(info) == [model_registry.resolve_model_path(tiny_model_path)]
+    assert info[model_registry.resolve_model_path(tiny_model_path)].load_seconds > 0
+
+
+def test_get_model_prefers_quantized_variant(tiny_model_path):
+    # Without an .ftz next to it, quantized=True falls back to the .bin model
+    assert model_registry.get_model(tiny_model_path, quantized=True) is model_registry.get_model(tiny_model_path)
+    assert model_registry.resolve_model_path(tiny_model_path, quantized=True).endswith(".bin")
+
+
+def _write_training_file(path, n=300):
+    # Quantization needs at least 256 embedding rows, hence the numbered tokens
+    path.write_text("\n".join(
+        f"__label__high_quality the history of science {i}\n__label__low_quality buy now click here {i}"
+        for i in range(n)
+    ))
+    return str(path)
+
+
+def test_quantized_variant_and_benchmark(tmp_path):
+    import fasttext
+
+    model_path = str(tmp_path / "model.bin")
+    fasttext.train_supervised(
+        input=_write_training_file(tmp_path / "train.txt"), epoch=5, dim=10, thread=1, verbose=0
+    ).save_model(model_path)
+    model_registry.unload_models()
+
+    ftz_path = model_registry.quantize_model(model_path, cutoff=0, dsub=2)
+    assert ftz_path == model_registry.quantized_path(model_path)
+    try:
+        assert model_registry.get_model(model_path, quantized=True).is_quantized()
+        assert not model_registry.get_model(model_path).is_quantized()
+    finally:
+        model_registry.unload_models()
+
+    texts = ["the history of science and the study of nature", "buy now click here free shipping deals"] * 10
+    gold = ["high_quality", "low_quality"] * 10
+    report = model_registry.benchmark_quantized(
+        model_path, {"fixtures": (model_registry.fixture_texts(str(FIXTURES_PATH)), None), "heldout": (texts, gold)}, [ftz_path]
+    )
+    full, small = report[model_path], report[ftz_path]
+    assert full["heldout"]["agreement"] == 1.0 and full["heldout"]["mean_abs_score_diff"] == 0.0
+    assert small["file_bytes"] < full["file_bytes"]
+    assert small["heldout"]["agreement"] == small["heldout"]["accuracy"] == 1.0
+    assert 0.0 <= small["fixtures"]["agreement"] <= 1.0
+    assert small["fixtures"]["predictions_per_second"] > 0
+
+
+def test_train_classifier_writes_quantized_model(tmp_path):
+    from cs336_data.quality_classifier import train_classifier
+
+    model_path = str(tmp_path / "model.bin")
+    train_classifier(
+        _write_training_file(tmp_path / "train.txt"), model_path,
+        quantize={"cutoff": 300, "dsub": 5, "retrain": True}, epoch=5, dim=10, thread=1, verbose=0,
+    )
+    try:
+        quantized = model_registry.get_model(model_path, quantized=True)
+        assert quantized.is_quantized()
+        assert quantized.predict("buy now click here")[0][0] == "__label__low_quality"
+    finally:
+        model_registry.unload_models()
+
+
+def _predict_in_worker(path):
+    already_loaded = model_registry.is_loaded(path)
+    labels, _ = model_registry.get_model(path).predict("buy now click here", k=1)
+    return already_loaded, labels[0]
+
+
+def test_shared_model_pool_preloads_before_fork(tiny_model_path):
+    with model_registry.shared_model_pool(max_workers=2, preload=[tiny_model_path]) as pool:
+        results = list(pool.map(_predict_in_worker, [tiny_model_path] * 4))
+    assert model_registry.is_loaded(tiny_model_path)
+    assert all(already_loaded for already_loaded, _ in results)
+    assert {label for _, label in results} == {"__label__low_quality"}
+
+
+def _die_in_worker(paths, quantized, results):
+    os._exit(3)
+
+
+def test_benchmark_shared_models_fails_when_a_worker_dies(tiny_model_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "_report_worker_memory", _die_in_worker)
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        model_registry.benchmark_shared_models([tiny_model_path], num_workers=2, timeout=60)
+    assert time.perf_counter() - start < 30
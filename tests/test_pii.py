@@ -1,6 +1,15 @@
 import logging
+import random
 
-from .adapters import run_mask_emails, run_mask_ips, run_mask_phone_numbers
+from .adapters import (
+    run_apply_pii_spans,
+    run_detect_pii_batch,
+    run_mask_emails,
+    run_mask_ips,
+    run_mask_phone_numbers,
+    run_mask_pii,
+)
+from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -57,3 +66,80 @@ def test_mask_ips():
     masked_text, num_masked = run_mask_ips(test_string)
     assert masked_text == expected_masked_text
     assert num_masked == 1
+
+
+def test_mask_pii_all_types():
+    test_string = (
+        "Email pl@fakedomain.ai or call (283) 182 3829. "
+        "The server at 192.0.2.146 is run by spl@fakedomain.ai, phone 283-182-3829."
+    )
+    expected_masked_text = (
+        "Email |||EMAIL_ADDRESS||| or call |||PHONE_NUMBER|||. "
+        "The server at |||IP_ADDRESS||| is run by |||EMAIL_ADDRESS|||, phone |||PHONE_NUMBER|||."
+    )
+    masked_text, counts = run_mask_pii(test_string)
+    assert masked_text == expected_masked_text
+    assert counts == {"email": 2, "phone": 2, "ip": 1}
+
+
+def test_mask_pii_matches_sequential_masking():
+    with open(FIXTURES_PATH / "moby_extracted.txt") as f:
+        text = f.read()
+    text += " Contact test@gmail.com at 2831823829 from 10.0.0.1."
+
+    expected, email_count = run_mask_emails(text)
+    expected, phone_count = run_mask_phone_numbers(expected)
+    expected, ip_count = run_mask_ips(expected)
+    masked_text, counts = run_mask_pii(text)
+    assert masked_text == expected
+    assert counts == {"email": email_count, "phone": phone_count, "ip": ip_count}
+
+    clean_text = "No personal information here."
+    assert run_mask_pii(clean_text) == (clean_text, {"email": 0, "phone": 0, "ip": 0})
+
+
+def _mask_sequentially(text):
+    text, _ = run_mask_emails(text)
+    text, _ = run_mask_phone_numbers(text)
+    return run_mask_ips(text)[0]
+
+
+def test_mask_pii_overlaps_match_sequential_masking():
+    # An email right after a phone number, and a phone number inside an IP
+    assert run_mask_pii("Call (555) 123-4567john@example.com")[0] == _mask_sequentially(
+        "Call (555) 123-4567john@example.com"
+    )
+    assert run_mask_pii("10.0.0.123 456 7890")[0] == _mask_sequentially("10.0.0.123 456 7890")
+    assert run_mask_pii("10.0.0.123 456 7890")[0] == "10.0.0.|||PHONE_NUMBER|||"
+
+    rng = random.Random(0)
+    alphabet = "0123456789" * 3 + "@.-() ab"
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert run_mask_pii(text)[0] == _mask_sequentially(text), text
+
+
+def test_detect_pii_batch_email_after_phone():
+    text = "Call (555) 123-4567john@example.com"
+    (spans,) = run_detect_pii_batch([text], num_workers=1)
+    assert 0 in spans[:, 2].tolist()
+    assert run_apply_pii_spans(text, spans) == _mask_sequentially(text)
+    assert "john@example.com" not in run_apply_pii_spans(text, spans)
+
+
+def test_detect_pii_batch_spans():
+    texts = [
+        "Write to pl@fakedomain.ai or call 283-182-3829.",
+        "No personal information here.",
+        "The server at 192.0.2.146 answers.",
+    ] * 3
+    expected_types = [[0, 1], [], [2]] * 3
+    for num_workers in (1, 2):
+        all_spans = run_detect_pii_batch(texts, num_workers=num_workers)
+        assert len(all_spans) == len(texts)
+        for text, spans, types in zip(texts, all_spans, expected_types):
+            assert spans.shape == (len(types), 3)
+            assert spans[:, 2].tolist() == types
+            # Masking lazily from the spans gives the same text as PIIMasker.mask
+            assert run_apply_pii_spans(text, spans) == run_mask_pii(text)[0]
+    assert texts[0][all_spans[0][0, 0]:all_spans[0][0, 1]] == "pl@fakedomain.ai"
@@ -1,6 +1,23 @@
+import gzip
 import logging
+import os
+import pathlib
+import random
+import subprocess
+import sys
+from collections import Counter
 
-from .adapters import run_classify_quality, run_gopher_quality_filter
+from cs336_data.model_registry import get_model
+from cs336_data.quality_classifier import classify_string, classify_strings
+
+from .adapters import (
+    run_classify_quality,
+    run_compute_gopher_stats,
+    run_gopher_full_filter,
+    run_gopher_quality_filter,
+    run_prepare_fasttext_data,
+    run_sample_urls,
+)
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -92,3 +109,175 @@ def test_gopher_less_than_80_percent_words_with_alphabetic_character():
     words += ["word" for _ in range(2)]
     text = "the and " + " ".join(words)
     assert not run_gopher_quality_filter(text)
+
+
+def test_gopher_fast_mode():
+    valid_texts = [
+        "This should definitely be a valid input text and of high quality according to Gopher rules. " * 100,
+        "The string you are reading is a long snippet of text." * 100,
+        "The string you are reading is an okay example of text. " * 5000,
+        "the with " * 100,
+        "the and this is fine " * 100,
+        "\n".join(["The line here is an example of ending with ellipsis..."] * 30 + ["This is a normal line."] * 230),
+    ]
+    invalid_texts = [
+        "The string you are reading is a short snippet of text.",
+        "The string you are reading is too long of a text. " * 50000,
+        "the be " * 100,
+        "the and " + "extraordinarily extraordinarily extraordinarily longesest " * 100,
+        "\n".join(
+            ["The line here is an example of line ending with an ellipsis..."] * 70 + ["This is a normal line."] * 30
+        ),
+        "the and " + " ".join(["123"] * 8 + ["word"] * 2),
+    ]
+    for text in valid_texts:
+        assert run_gopher_quality_filter(text, fast=True)
+    for text in invalid_texts:
+        assert not run_gopher_quality_filter(text, fast=True)
+
+
+def test_gopher_fast_tokenizer_close_to_nltk():
+    from nltk.tokenize import NLTKWordTokenizer
+
+    from cs336_data.gopher_filter import FAST_WORD_PATTERN
+
+    for name in ["high_quality_wiki_reference.txt", "low_quality_cc.txt", "moby_extracted.txt"]:
+        with open(FIXTURES_PATH / name) as f:
+            text = f.read()
+        nltk_words = NLTKWordTokenizer().tokenize(text)
+        fast_words = FAST_WORD_PATTERN.findall(text)
+        assert abs(len(fast_words) - len(nltk_words)) / len(nltk_words) < 0.05
+        nltk_mean = sum(map(len, nltk_words)) / len(nltk_words)
+        fast_mean = sum(map(len, fast_words)) / len(fast_words)
+        assert abs(fast_mean - nltk_mean) / nltk_mean < 0.05
+
+
+def test_gopher_full_filter():
+    with open(FIXTURES_PATH / "high_quality_wiki_reference.txt") as f:
+        assert run_gopher_full_filter(f.read())
+
+    # Passes the four basic rules but is one long repeated 17-gram
+    text = "This should definitely be a valid input text and of high quality according to Gopher rules. " * 100
+    assert run_gopher_quality_filter(text, fast=True)
+    assert not run_gopher_full_filter(text)
+    stats = run_compute_gopher_stats(text)
+    assert stats.duplicate_10gram_char_fraction > 0.9
+
+    stats = run_compute_gopher_stats("first line\nsecond line\nfirst line\n\n# heading\n- bullet")
+    assert stats.duplicate_line_fraction == 1 / 5
+    assert stats.bullet_line_fraction == 1 / 6
+    assert stats.num_stop_words == 0
+
+
+def test_gopher_ngram_stats_match_naive_computation():
+    from cs336_data.gopher_filter import FAST_WORD_PATTERN
+
+    rng = random.Random(0)
+    vocabulary = ["alpha", "beta", "gamma", "delta", "epsilon", "to", "of"]
+    text = " ".join(rng.choice(vocabulary) for _ in range(400))
+    words = FAST_WORD_PATTERN.findall(text)
+    total_chars = sum(map(len, words))
+    stats = run_compute_gopher_stats(text)
+
+    for n in (2, 3, 4):
+        ngrams = Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+        top_count = max(ngrams.values())
+        # Ties on the top count are broken by the longest n-gram
+        expected = max(top_count * sum(map(len, ngram)) for ngram, c in ngrams.items() if c == top_count) / total_chars
+        assert getattr(stats, f"top_{n}gram_char_fraction") == expected
+
+    for n in range(5, 11):
+        ngrams = Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+        covered = set()
+        for i in range(len(words) - n + 1):
+            if ngrams[tuple(words[i:i + n])] > 1:
+                covered.update(range(i, i + n))
+        expected = sum(len(words[i]) for i in covered) / total_chars
+        assert abs(getattr(stats, f"duplicate_{n}gram_char_fraction") - expected) < 1e-9
+
+
+def test_gopher_ngram_stats_independent_of_hash_seed():
+    # Every 2-gram occurs once, so the top 2-gram is a tie between n-grams of different lengths
+    text = "a bb ccc dddd eeeee ffffff"
+    script = (
+        "from cs336_data.gopher_filter import compute_gopher_stats; "
+        f"print(repr(tuple(compute_gopher_stats({text!r}))))"
+    )
+    root = pathlib.Path(__file__).resolve().parent.parent
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script], cwd=root, env={**os.environ, "PYTHONHASHSEED": seed},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        for seed in ("0", "1", "2")
+    }
+    assert len(outputs) == 1
+    assert run_compute_gopher_stats(text).top_2gram_char_fraction == 11 / 21
+
+
+def test_sample_urls_reservoir(tmp_path):
+    urls_file = tmp_path / "urls.txt.gz"
+    valid = [f"https://en.wikipedia.org/wiki/Page_{i}" for i in range(5000)]
+    with gzip.open(urls_file, "wt") as f:
+        for i, url in enumerate(valid):
+            f.write(url + "\n")
+            if i % 100 == 0:
+                f.write("not a url\n")
+
+    first = run_sample_urls(urls_file, 200, tmp_path / "a.txt", seed=7)
+    second = run_sample_urls(urls_file, 200, tmp_path / "b.txt", seed=7)
+    sampled = open(first).read().splitlines()
+    assert sampled == open(second).read().splitlines()
+    assert len(sampled) == len(set(sampled)) == 200
+    assert set(sampled) <= set(valid)
+
+    # Fewer valid URLs than requested returns all of them
+    everything = run_sample_urls(urls_file, 10_000, tmp_path / "c.txt", seed=7)
+    assert sorted(open(everything).read().splitlines()) == sorted(valid)
+
+
+def test_prepare_fasttext_data_streaming(tmp_path):
+    rng = random.Random(0)
+    vocabulary = ["alpha", "beta", "gamma", "delta", "epsilon"]
+
+    def docs(prefix, n):
+        for i in range(n):
+            yield f"{prefix}{i}\n" + " ".join(rng.choices(vocabulary, k=rng.randint(5, 400)))
+
+    positives, negatives = list(docs("pos", 300)), list(docs("neg", 300))
+    expected = sorted(
+        [f"__label__high_quality {' '.join(t.split()[:300])}" for t in positives if len(t.split()) > 30]
+        + [f"__label__low_quality {' '.join(t.split()[:300])}" for t in negatives if len(t.split()) > 30]
+    )
+
+    outputs = []
+    for num_workers in (1, 2):
+        train = tmp_path / f"train_{num_workers}.txt"
+        valid = tmp_path / f"valid_{num_workers}.txt"
+        # A tiny shuffle buffer forces the bucket files to be scattered more than once
+        run_prepare_fasttext_data(
+            iter(positives), iter(negatives), train, validation_file=str(valid),
+            num_workers=num_workers, shuffle_buffer=20, seed=1,
+        )
+        outputs.append((train.read_text(), valid.read_text()))
+
+    assert outputs[0] == outputs[1]
+    train_lines, valid_lines = outputs[0][0].splitlines(), outputs[0][1].splitlines()
+    assert 0 < len(valid_lines) < len(train_lines)
+    assert sorted(train_lines + valid_lines) == expected
+    assert train_lines != sorted(train_lines)
+
+
+def test_classify_strings_matches_single_predictions(tiny_model_path):
+    model = get_model(tiny_model_path)
+    texts = [
+        "the history of science\nand the study of nature",
+        "buy now   click here\n\nfree shipping",
+        "",
+    ] * 5
+    labels, scores = classify_strings(model, iter(texts), batch_size=4)
+    assert labels.shape == scores.shape == (len(texts),)
+    for text, label, score in zip(texts, labels, scores):
+        expected_label, expected_score = classify_string(model, text)
+        assert label == expected_label
+        assert abs(score - expected_score) < 1e-5
@@ -0,0 +1,83 @@
+import importlib
+import os
+
+import pytest
+
+from .adapters import run_step_cache
+
+
+def test_step_cache_reruns_only_invalidated_steps(tmp_path):
+    cache = run_step_cache(tmp_path / "cache")
+    raw = tmp_path / "raw.txt"
+    raw.write_text("b\na\nc\n")
+    calls = []
+
+    def sort_lines(out):
+        calls.append("sort")
+        lines = sorted(raw.read_text().split())
+        with open(os.path.join(out, "sorted.txt"), "w") as f:
+            f.write("\n".join(lines))
+
+    def pipeline(repeat):
+        first = cache.run("sort", sort_lines, files=[raw], code=[sort_lines])
+
+        def repeat_lines(out):
+            calls.append("repeat")
+            with open(first.path("sorted.txt")) as src, open(os.path.join(out, "repeated.txt"), "w") as dst:
+                dst.write(src.read() * repeat)
+
+        second = cache.run("repeat", repeat_lines, params={"repeat": repeat}, inputs=[first])
+        return first, second
+
+    first, second = pipeline(2)
+    assert calls == ["sort", "repeat"]
+    assert open(second.path("repeated.txt")).read() == "a\nb\nc" * 2
+
+    # Nothing changed: both steps are reused
+    assert pipeline(2) == (first, second)
+    assert calls == ["sort", "repeat"]
+
+    # A parameter change only re-runs the step it belongs to, under a new key
+    _, changed = pipeline(3)
+    assert calls == ["sort", "repeat", "repeat"]
+    assert changed.key != second.key and os.path.isdir(second.dir)
+
+    # Changing an input file invalidates the first step and everything downstream
+    raw.write_text("d\na\n")
+    new_first, _ = pipeline(2)
+    assert calls[-2:] == ["sort", "repeat"]
+    assert new_first.key != first.key
+
+    assert {entry["name"] for entry in cache.steps()} == {"sort", "repeat"}
+    assert len(cache.steps()) == 5
+
+
+def test_step_cache_failed_step_is_not_cached(tmp_path):
+    cache = run_step_cache(tmp_path / "cache")
+
+    def fail(out):
+        with open(os.path.join(out, "partial.txt"), "w") as f:
+            f.write("half")
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        cache.run("flaky", fail)
+    assert cache.steps() == []
+
+    # The retry starts from an empty directory
+    step = cache.run("flaky", lambda out: open(os.path.join(out, "done.txt"), "w").close())
+    assert sorted(os.listdir(step.dir)) == ["done.txt", "step.json"]
+
+
+def test_step_cache_key_tracks_module_source(tmp_path, monkeypatch):
+    module_path = tmp_path / "pipeline_helpers.py"
+    module_path.write_text("def clean(text):\n    return text.strip()\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("pipeline_helpers")
+    cache = run_step_cache(tmp_path / "cache")
+    before = cache.key("extract", code=[module])
+    assert cache.key("extract", code=[module]) == before
+
+    module_path.write_text("def clean(text):\n    return text.strip().lower()\n")
+    importlib.reload(module)
+    assert cache.key("extract", code=[module]) != before